@@ -1,15 +1,57 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, Response
+from flask import send_from_directory
+from flask import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 import mysql.connector
-from werkzeug.security import generate_password_hash, check_password_hash
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import atexit
+import base64
+import binascii
+import bisect
+import gzip
+import re
 import secrets
 import hashlib
+import importlib.machinery
+import json
+import logging
+import logging.handlers
+import math
+import mimetypes
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import password_worker
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STARTUP_BEGAN = time.perf_counter()
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# Compiled templates are kept on disk and shared by every worker, so new workers skip compiling them.
+# Entries are checked against the template source, so an edited template is simply recompiled.
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(app.root_path, 'cache', 'jinja'))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+
 DELIVERY_CHARGE = Decimal('60.00')
 LOYALTY_POINTS_RATE = Decimal('0.01')  # 1% of discounted subtotal
 
@@ -21,8 +63,172 @@ DB_CONFIG = {
     'database': 'enter_your_database_name'
 }
 
+# Connection pool settings
+DB_POOL_CONFIG = {
+    'pool_size': 10,      # connections kept open while idle
+    'max_overflow': 10,   # extra connections allowed under load, closed on release
+    'timeout': 30,        # seconds to wait for a free connection
+    'recycle': 3600       # seconds before a connection is replaced
+}
+
+class PoolTimeoutError(Exception):
+    pass
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool with overflow, health checks and recycling"""
+
+    def __init__(self, db_config, pool_size=10, max_overflow=10, timeout=30, recycle=3600):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = deque()      # (conn, created_at) ready for reuse
+        self._created_at = {}     # id(conn) -> created_at for checked out connections
+        self._open = 0            # connections currently open (idle + in use)
+        self._cond = threading.Condition()
+        self._counters = {
+            'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'timeouts': 0,
+            'created': 0, 'recycled': 0, 'discarded': 0
+        }
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+        conn = created_at = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    self._open += 1
+                    break
+                waited = True
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeoutError(f'No database connection available after {timeout}s')
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_usable(conn, created_at):
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._counters['recycled'] += 1
+            if conn is None:
+                conn = mysql.connector.connect(**self.db_config)
+                created_at = time.monotonic()
+                with self._cond:
+                    self._counters['created'] += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(conn)] = created_at
+            self._counters['checkouts'] += 1
+            if waited:
+                self._counters['waits'] += 1
+                self._counters['wait_time'] += time.monotonic() - start
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), None)
+        if created_at is None:
+            return
+        if not discard:
+            try:
+                # End any open snapshot so the next borrower sees fresh data
+                if conn.in_transaction:
+                    conn.rollback()
+            except mysql.connector.Error:
+                discard = True
+        with self._cond:
+            if discard or len(self._idle) >= self.pool_size:
+                self._open -= 1
+                if discard:
+                    self._counters['discarded'] += 1
+                keep = False
+            else:
+                self._idle.append((conn, created_at))
+                keep = True
+            self._cond.notify()
+        if not keep:
+            self._close(conn)
+
+    def prefill(self, count=None):
+        """Open connections up front (at most pool_size) so the first requests don't pay for them"""
+        count = min(self.pool_size if count is None else count, self.pool_size)
+        conns = []
+        try:
+            for _ in range(count):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+        return len(conns)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection outside of a request, e.g. from a background thread"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats['in_use'] = len(self._created_at)
+            stats['idle'] = len(self._idle)
+            stats['open'] = self._open
+            stats['overflow'] = max(0, self._open - self.pool_size)
+        stats['pool_size'] = self.pool_size
+        stats['max_overflow'] = self.max_overflow
+        stats['avg_wait_time'] = stats['wait_time'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+    def _is_usable(self, conn, created_at):
+        if time.monotonic() - created_at > self.recycle:
+            return False
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+db_pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    """Return the pooled connection held by the current request"""
+    if 'db_conn' not in g:
+        start = time.perf_counter()
+        g.db_conn = db_pool.acquire(g.get('db_acquire_timeout'))
+        DB_CONNECTION_ACQUIRE.observe(time.perf_counter() - start)
+    return InstrumentedConnection(g.db_conn)
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.release(conn, discard=g.pop('db_conn_broken', False))
 
 def execute_query(query, params=None, fetch=False):
     conn = get_db_connection()
@@ -36,16 +242,813 @@ def execute_query(query, params=None, fetch=False):
             result = cursor.rowcount
         return result
     except Exception as e:
-        conn.rollback()
+        if isinstance(e, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)):
+            # Don't hand a dead connection back to the pool
+            g.db_conn_broken = True
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            g.db_conn_broken = True
         raise e
     finally:
         cursor.close()
-        conn.close()
+
+# Metrics
+# With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty directory before start-up
+# so every worker writes its samples there and /metrics adds them up.
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_DURATION = Histogram('shopease_request_duration_seconds', 'Request latency by endpoint',
+                             ['endpoint', 'method', 'status'])
+REQUEST_EXCEPTIONS = Counter('shopease_request_exceptions_total', 'Requests that raised an unhandled exception',
+                             ['endpoint'])
+REQUEST_QUERIES = Histogram('shopease_request_db_queries', 'Database queries issued per request', ['endpoint'],
+                            buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+REQUEST_DB_TIME = Histogram('shopease_request_db_seconds', 'Time spent in database queries per request',
+                            ['endpoint'], buckets=QUERY_BUCKETS)
+DB_QUERY_DURATION = Histogram('shopease_db_query_duration_seconds', 'Database query latency by statement type',
+                              ['statement'], buckets=QUERY_BUCKETS)
+DB_CONNECTION_ACQUIRE = Histogram('shopease_db_connection_acquire_seconds', 'Time to get a connection from the pool',
+                                  buckets=QUERY_BUCKETS)
+TEMPLATE_RENDER = Histogram('shopease_template_render_seconds', 'Template render time', ['template'],
+                            buckets=QUERY_BUCKETS)
+STATEMENT_TYPES = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH'}
+
+def statement_type(query):
+    words = query.split(None, 1)
+    verb = words[0].upper() if words else ''
+    return verb.lower() if verb in STATEMENT_TYPES else 'other'
+
+def record_query(query, params, elapsed, cursor):
+    DB_QUERY_DURATION.labels(statement_type(query)).observe(elapsed)
+    if g:
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + elapsed
+        if elapsed >= SLOW_QUERY_THRESHOLD:
+            # Logged at the end of the request, once the result set has been read
+            g.setdefault('slow_queries', []).append((query, params, elapsed, cursor))
+
+class InstrumentedCursor:
+    """Cursor wrapper that times every statement"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params, *args, **kwargs)
+        finally:
+            record_query(query, params, time.perf_counter() - start, self._cursor)
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params, *args, **kwargs)
+        finally:
+            record_query(query, seq_params[0] if seq_params else None, time.perf_counter() - start, self._cursor)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    """Connection wrapper whose cursors are instrumented; everything else goes to the real connection"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def endpoint_label():
+    # Unmatched URLs share one label so scanners can't blow up the series count
+    return request.endpoint or 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    endpoint = endpoint_label()
+    if exc is not None:
+        REQUEST_EXCEPTIONS.labels(endpoint).inc()
+    status = 500 if exc is not None else g.pop('response_status', 500)
+    REQUEST_DURATION.labels(endpoint, request.method, status).observe(time.perf_counter() - start)
+    REQUEST_QUERIES.labels(endpoint).observe(g.pop('query_count', 0))
+    REQUEST_DB_TIME.labels(endpoint).observe(g.pop('query_time', 0.0))
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template_render(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        TEMPLATE_RENDER.labels(template.name or 'string').observe(time.perf_counter() - starts.pop())
+
+# Slow query log
+SLOW_QUERY_THRESHOLD = 0.2            # seconds
+SLOW_QUERY_LOG = os.path.join(app.root_path, 'logs', 'slow_queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_EXPLAIN_INTERVAL = 300     # seconds between EXPLAINs of the same fingerprint
+EXPLAINABLE_STATEMENTS = {'select', 'update', 'delete', 'insert', 'replace', 'with'}
+
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r'--[^\n]*|/\*.*?\*/', re.S), ' '),
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+slow_query_logger = logging.getLogger('shopease.slow_queries')
+slow_query_logger.setLevel(logging.INFO)
+slow_query_logger.propagate = False
+_slow_query_lock = threading.Lock()
+_last_explained = {}
+
+def query_fingerprint(query):
+    """Normalised SQL with literals and parameters replaced by ?"""
+    for pattern, replacement in _FINGERPRINT_PATTERNS:
+        query = pattern.sub(replacement, query)
+    return query.strip()
+
+def redact_params(params):
+    # Keep numbers, dates and NULLs for context; strings may hold emails, addresses or hashes
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact_params([value])[0] for key, value in params.items()}
+    redacted = []
+    for value in params:
+        if value is None or isinstance(value, (bool, int, float, Decimal, date)):
+            redacted.append(value if not isinstance(value, (Decimal, date)) else str(value))
+        else:
+            redacted.append(f'<{type(value).__name__} len={len(value) if hasattr(value, "__len__") else "?"}>')
+    return redacted
+
+def _slow_query_handler():
+    with _slow_query_lock:
+        if not slow_query_logger.handlers:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+                                                           backupCount=SLOW_QUERY_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            slow_query_logger.addHandler(handler)
+
+def explain_query(conn, query, params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('EXPLAIN FORMAT=JSON ' + query, params)
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    finally:
+        cursor.close()
+
+@app.teardown_request
+def log_slow_queries(exc):
+    slow = g.pop('slow_queries', None)
+    if not slow:
+        return
+    _slow_query_handler()
+    conn = g.get('db_conn')
+    for query, params, elapsed, cursor in slow:
+        fingerprint = query_fingerprint(query)
+        digest = hashlib.md5(fingerprint.encode()).hexdigest()[:16]
+        plan = None
+        now = time.time()
+        if (conn is not None and not g.get('db_conn_broken') and statement_type(query) in EXPLAINABLE_STATEMENTS
+                and now - _last_explained.get(digest, 0) > SLOW_QUERY_EXPLAIN_INTERVAL):
+            _last_explained[digest] = now
+            try:
+                plan = explain_query(conn, query, params)
+            except (mysql.connector.Error, ValueError) as e:
+                plan = {'error': str(e)}
+        rows = getattr(cursor, 'rowcount', -1)
+        slow_query_logger.info(json.dumps({
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'fingerprint': digest,
+            'sql': fingerprint,
+            'params': redact_params(params),
+            'duration': round(elapsed, 6),
+            'rows': rows if rows is not None else -1,
+            'endpoint': request.endpoint if request else g.get('endpoint'),
+            'plan': plan
+        }, default=str))
+
+def slow_query_summary():
+    """Aggregate the current slow query log by fingerprint, worst total time first"""
+    summary = {}
+    try:
+        with open(SLOW_QUERY_LOG) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                item = summary.setdefault(entry['fingerprint'], {
+                    'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total': 0.0,
+                    'max': 0.0, 'rows': 0, 'endpoints': set(), 'last_seen': None, 'plan': None, 'params': None
+                })
+                item['count'] += 1
+                item['total'] += entry['duration']
+                item['max'] = max(item['max'], entry['duration'])
+                item['rows'] += max(entry['rows'], 0)
+                item['endpoints'].add(entry.get('endpoint') or '-')
+                item['last_seen'] = entry['time']
+                item['params'] = entry['params']
+                if entry.get('plan'):
+                    item['plan'] = entry['plan']
+    except FileNotFoundError:
+        return []
+    for item in summary.values():
+        item['avg'] = item['total'] / item['count']
+        item['avg_rows'] = item['rows'] / item['count']
+        item['endpoints'] = sorted(item['endpoints'])
+    return sorted(summary.values(), key=lambda item: item['total'], reverse=True)
+
+@app.route('/metrics')
+def metrics():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+# Concurrent reads
+# fan_out() runs a route's independent reads at the same time. Each task runs in its own app context
+# and so borrows its own pooled connection; the page waits for its slowest read instead of all of them.
+FAN_OUT_WORKERS = 8      # threads shared by every request in the process, keep below the DB pool size
+FAN_OUT_TIMEOUT = 5.0    # seconds a route waits for its tasks, time spent queued included
+
+FAN_OUT_TASKS = Counter('shopease_fan_out_tasks_total', 'Concurrent read tasks by outcome',
+                        ['endpoint', 'task', 'outcome'])
+
+class FanOutTimeout(Exception):
+    pass
+
+_fan_out_executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix='fan-out')
+
+def _run_task(endpoint, fn, args, deadline=None):
+    with app.app_context():
+        g.endpoint = endpoint
+        if deadline is not None:
+            # Nobody waits for the result after the deadline, so don't wait longer for a connection
+            g.db_acquire_timeout = max(0.0, deadline - time.monotonic())
+        try:
+            return fn(*args), g.get('query_count', 0), g.get('query_time', 0.0)
+        finally:
+            # No request teardown runs here, so log this task's slow queries while its connection is held
+            log_slow_queries(None)
+
+def fan_out(tasks, defaults=None, timeout=FAN_OUT_TIMEOUT):
+    """Run independent reads concurrently and return {name: result}.
+
+    tasks maps a name to (function, *args). Tasks run outside the request, so pass them what they
+    need (e.g. the user ID) rather than reading session, and don't call fan_out from a task. A task
+    that fails or misses the deadline gets defaults[name] if there is one; otherwise its error is
+    raised once every task has been waited for. Tasks wait for a pool connection only until the
+    deadline, so give every task a default and read what the page can't do without in the request.
+    """
+    defaults = defaults or {}
+    endpoint = request.endpoint if request else None
+    deadline = time.monotonic() + timeout
+    futures = {name: _fan_out_executor.submit(_run_task, endpoint, task[0], task[1:], deadline)
+               for name, task in tasks.items()}
+    results, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            results[name], queries, query_time = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            if g:
+                g.query_count = g.get('query_count', 0) + queries
+                g.query_time = g.get('query_time', 0.0) + query_time
+            outcome = 'ok'
+        except FutureTimeoutError:
+            # A task that already started keeps running and returns its connection when done
+            future.cancel()
+            errors[name] = FanOutTimeout(f'{name} did not finish within {timeout}s')
+            outcome = 'timeout'
+        except Exception as e:
+            errors[name] = e
+            outcome = 'error'
+        FAN_OUT_TASKS.labels(endpoint or '-', name, outcome).inc()
+    for name, error in errors.items():
+        if name not in defaults:
+            raise error
+        print(f"Error in {endpoint} task {name}: {error}")
+        results[name] = defaults[name]
+    return results
+
+# Static assets
+# build_assets.py copies static/ into static/dist under content-hashed names, with .gz/.br copies, and
+# writes a manifest. A fingerprinted file never changes, so browsers may keep it for a year.
+STATIC_DIST = os.path.join(app.static_folder, 'dist')
+STATIC_MANIFEST = os.path.join(STATIC_DIST, 'manifest.json')
+STATIC_MAX_AGE = 365 * 24 * 3600
+# Served until build_assets.py --fetch has vendored the files. Keep in sync with VENDOR_ASSETS in build_assets.py
+VENDOR_CDN = {
+    'vendor/bootstrap-5.3.0/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap-5.3.0/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome-6.0.0/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css'
+}
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Dynamic compression of rendered pages and JSON
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+COMPRESS_MIN_SIZE = 500     # bytes; smaller bodies aren't worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5          # fast enough per request, still smaller than gzip -9
+
+RESPONSE_BYTES = Counter('shopease_response_bytes_total', 'HTML and JSON body bytes before and after compression',
+                         ['encoding', 'stage'])
+
+def load_asset_manifest():
+    try:
+        with open(STATIC_MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+asset_manifest = load_asset_manifest()
+ASSET_VERSION = hashlib.sha1(json.dumps(asset_manifest, sort_keys=True).encode()).hexdigest()
+
+@app.template_global()
+def asset_url(name):
+    """URL of a file under static/: fingerprinted once built, else as is (or its CDN copy if not vendored)"""
+    fingerprinted = asset_manifest.get(name)
+    if fingerprinted:
+        return url_for('dist_asset', filename=fingerprinted)
+    if name in VENDOR_CDN and not os.path.isfile(os.path.join(app.static_folder, name)):
+        return VENDOR_CDN[name]
+    return url_for('static', filename=name)
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    # Pick a pre-compressed copy the client accepts; the browser decodes it transparently
+    for encoding, suffix in STATIC_ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(STATIC_DIST, filename + suffix)):
+            response = send_from_directory(STATIC_DIST, filename + suffix, max_age=STATIC_MAX_AGE,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(STATIC_DIST, filename, max_age=STATIC_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+def choose_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (response.mimetype not in COMPRESS_MIMETYPES or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is a different byte sequence, so a strong validator would be wrong
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    RESPONSE_BYTES.labels(encoding, 'raw').inc(len(data))
+    RESPONSE_BYTES.labels(encoding, 'sent').inc(len(compressed))
+    return response
 
 def currency_round(amount):
     """Round currency amounts to 2 decimal places"""
     return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+# Keyset pagination
+PAGE_SIZE = 25
+
+def encode_cursor(*values):
+    """Opaque URL-safe cursor holding the sort key of the last row on a page"""
+    payload = json.dumps([value.isoformat() if isinstance(value, (datetime, date)) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, *types):
+    """Decode a cursor into values of the given types; None if missing or malformed"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if len(values) != len(types):
+            return None
+        return tuple(kind.fromisoformat(value) if kind in (datetime, date) else kind(value)
+                     for kind, value in zip(types, values))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+def keyset_page(rows, limit, key):
+    """Trim a LIMIT n+1 result to n rows and return (rows, cursor for the next page)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+def parse_date_arg(name):
+    try:
+        return datetime.strptime(request.args.get(name, ''), '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def order_list_filters(alias='o'):
+    """SQL conditions for the status/date filters and cursor of an order list, newest first"""
+    clauses, params = [], []
+    filters = {key: request.args[key] for key in ('status', 'date_from', 'date_to') if request.args.get(key)}
+    if filters.get('status'):
+        clauses.append(f"{alias}.orderStatus = %s")
+        params.append(filters['status'])
+    date_from = parse_date_arg('date_from')
+    if date_from:
+        clauses.append(f"{alias}.orderDate >= %s")
+        params.append(date_from)
+    date_to = parse_date_arg('date_to')
+    if date_to:
+        clauses.append(f"{alias}.orderDate < %s")
+        params.append(date_to + timedelta(days=1))
+    after = decode_cursor(request.args.get('after', ''), datetime, int)
+    if after:
+        clauses.append(f"({alias}.orderDate < %s OR ({alias}.orderDate = %s AND {alias}.orderID < %s))")
+        params.extend([after[0], after[0], after[1]])
+    return ''.join(f" AND {clause}" for clause in clauses), params, filters
+
+def order_cursor_key(order):
+    return order['orderDate'], order['orderID']
+
+# List summaries
+# The per-status counts above the order and user lists group whole tables, so each worker reuses
+# them for a short while instead of recounting on every page view.
+SUMMARY_CACHE_TTL = 60       # seconds a summary may lag behind the list below it
+SUMMARY_CACHE_SIZE = 1000
+
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+def cached_summary(key, compute):
+    """compute()'s result, recomputed at most once per SUMMARY_CACHE_TTL for each key"""
+    now = time.monotonic()
+    with _summary_cache_lock:
+        entry = _summary_cache.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+    value = compute()
+    with _summary_cache_lock:
+        _summary_cache[key] = (value, now + SUMMARY_CACHE_TTL)
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return value
+
+def discard_summary(key):
+    """Drop a summary after a change made on the page it belongs to, so the next view shows it"""
+    with _summary_cache_lock:
+        _summary_cache.pop(key, None)
+
+# Catalog snapshot
+CATALOG_MAX_AGE = 300  # seconds before a full reload, picks up changes made by other workers
+CATALOG_RELOAD_RETRY = 30  # seconds before a failed background reload is tried again
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+def _offer_key(offer):
+    return (offer['dateAdded'], offer['productID'], offer['inventoryID'])
+
+def _pick_best_offer(offers):
+    """inventoryID of the cheapest in-stock offer, preferring the seller with more stock"""
+    live = [offer for offer in offers if offer['currentStock'] > 0]
+    if not live:
+        return None
+    return min(live, key=lambda offer: (offer['pricePerUnit'], -offer['currentStock'], offer['inventoryID']))['inventoryID']
+
+def _discount_is_valid(discount, now):
+    # Same comparison MySQL does for DATE columns against a DATETIME
+    return (datetime.combine(discount['startDate'], datetime.min.time()) <= now
+            and datetime.combine(discount['endDate'], datetime.min.time()) >= now
+            and (discount['useLimit'] or 0) > 0)
+
+class CatalogSnapshot:
+    """Read-only view of products, live offers, categories and discounts.
+
+    A snapshot is never modified once published; refreshes build a new one
+    so requests can read it without locking.
+    """
+
+    def __init__(self, version, products_version, loaded_at, products, inventory, by_product, offers, best_offers,
+                 live, categories, discounts):
+        self.version = version
+        self.products_version = products_version  # only bumped when Products rows change
+        self.loaded_at = loaded_at
+        self.products = products        # productID -> Products row
+        self.inventory = inventory      # inventoryID -> Inventory row of an active seller
+        self.by_product = by_product    # productID -> tuple of inventoryIDs
+        self.offers = offers            # inventoryID -> product row merged with its inventory row
+        self.best_offers = best_offers  # productID -> inventoryID of its best live offer
+        self.live = live                # sorted keys of in-stock offers, oldest first
+        self.categories = categories
+        self.discounts = discounts
+
+    def top_products(self, limit):
+        return [self.offers[key[2]] for key in self.live[:-limit - 1:-1]]
+
+    def live_offers(self):
+        """In-stock offers from active sellers, newest products first"""
+        for key in reversed(self.live):
+            yield self.offers[key[2]]
+
+    def offer(self, inventory_id):
+        return self.offers.get(inventory_id)
+
+    def product_offers(self, product_id):
+        return [self.offers[iid] for iid in self.by_product.get(product_id, ())]
+
+    def best_offer(self, product_id):
+        iid = self.best_offers.get(product_id)
+        return self.offers[iid] if iid is not None else None
+
+    def category_list(self):
+        return [{'productCategory': category} for category in self.categories]
+
+    def active_discounts(self, now, limit=None):
+        discounts = [d for d in self.discounts if _discount_is_valid(d, now)]
+        return discounts[:limit] if limit else discounts
+
+class Catalog:
+    """Versioned in-process catalog, refreshed incrementally from change markers.
+
+    Writers call the mark_* methods after committing; the next read reloads
+    only the marked rows. Every CATALOG_MAX_AGE seconds a full reload runs on
+    a background thread while requests keep reading the current snapshot.
+    """
+
+    _INVENTORY_QUERY = """
+        SELECT i.inventoryID, i.productID, i.sellerID, i.pricePerUnit, i.currentStock, i.reorderLevel,
+               u.name as seller_name
+        FROM Inventory i
+        JOIN Users u ON i.sellerID = u.userID
+        WHERE u.status = 'active'
+    """
+
+    def __init__(self, max_age=CATALOG_MAX_AGE):
+        self.max_age = max_age
+        self._snapshot = None
+        self._version = 0
+        self._products_version = 0
+        self._lock = threading.Lock()
+        self._changes_lock = threading.Lock()
+        self._reset_changes()
+        self._reload_due = 0.0
+        self._reload_changes = None  # changes applied while a background reload runs, None when idle
+
+    def _reset_changes(self):
+        self._changed_products = set()
+        self._changed_inventory = set()
+        self._changed_sellers = set()
+        self._changed_discounts = False
+
+    def mark_product(self, product_id):
+        with self._changes_lock:
+            self._changed_products.add(int(product_id))
+
+    def mark_inventory(self, *inventory_ids):
+        with self._changes_lock:
+            self._changed_inventory.update(int(iid) for iid in inventory_ids)
+
+    def mark_seller(self, seller_id):
+        with self._changes_lock:
+            self._changed_sellers.add(int(seller_id))
+
+    def mark_discounts(self):
+        with self._changes_lock:
+            self._changed_discounts = True
+
+    def _has_changes(self):
+        return bool(self._changed_products or self._changed_inventory
+                    or self._changed_sellers or self._changed_discounts)
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is None or self._has_changes():
+            snap = self._refresh()
+        if self._reload_changes is None and time.monotonic() > self._reload_due:
+            self._start_reload()
+        return snap
+
+    def _refresh(self):
+        with self._lock:
+            with self._changes_lock:
+                changes = (self._changed_products, self._changed_inventory,
+                           self._changed_sellers, self._changed_discounts)
+                self._reset_changes()
+            snap = self._snapshot
+            if snap is None:
+                snap = self._publish(self._load_all())
+            elif any(changes):
+                if self._reload_changes is not None:
+                    # The running reload may have read these rows before the change; apply them again on top of it
+                    for pending, changed in zip(self._reload_changes, changes[:3]):
+                        pending.update(changed)
+                    self._reload_changes[3] = self._reload_changes[3] or changes[3]
+                snap = self._incremental_load(snap, *changes)
+            self._snapshot = snap
+            return snap
+
+    def _start_reload(self):
+        with self._lock:
+            if self._reload_changes is not None or time.monotonic() <= self._reload_due:
+                return
+            self._reload_changes = [set(), set(), set(), False]
+        threading.Thread(target=self._reload_job, name='catalog-reload', daemon=True).start()
+
+    def _reload_job(self):
+        try:
+            _run_task('catalog_reload', self._reload, ())
+        except Exception as e:
+            print(f"Error reloading catalog: {e}")
+            with self._lock:
+                self._reload_due = time.monotonic() + CATALOG_RELOAD_RETRY
+                self._reload_changes = None
+
+    def _reload(self):
+        loaded = self._load_all()  # the slow part, done without holding the lock
+        with self._lock:
+            snap = self._publish(loaded)
+            if any(self._reload_changes):
+                snap = self._incremental_load(snap, *self._reload_changes)
+            self._snapshot = snap
+            self._reload_changes = None
+
+    def _load_discounts(self):
+        return execute_query("""
+            SELECT d.* FROM Discounts d
+            WHERE d.endDate >= CURDATE()
+            AND """ + DISCOUNT_HAS_USES + """
+            ORDER BY d.discountID
+        """, fetch=True)
+
+    def _load_all(self):
+        products = {row['productID']: row for row in execute_query("SELECT * FROM Products", fetch=True)}
+        inventory = {row['inventoryID']: row for row in execute_query(self._INVENTORY_QUERY, fetch=True)}
+        by_product = {}
+        for row in inventory.values():
+            by_product.setdefault(row['productID'], []).append(row['inventoryID'])
+        by_product = {pid: tuple(sorted(iids)) for pid, iids in by_product.items()}
+
+        offers = {}
+        live = []
+        for iid, row in inventory.items():
+            product = products.get(row['productID'])
+            if product is None:
+                continue
+            offers[iid] = offer = {**product, **row}
+            if offer['currentStock'] > 0:
+                live.append(_offer_key(offer))
+        live.sort()
+
+        best_offers = {}
+        for pid, iids in by_product.items():
+            best = _pick_best_offer([offers[iid] for iid in iids if iid in offers])
+            if best is not None:
+                best_offers[pid] = best
+
+        categories = sorted({p['productCategory'] for p in products.values()})
+        return (time.monotonic(), products, inventory, by_product, offers, best_offers, live, categories,
+                self._load_discounts())
+
+    def _publish(self, loaded):
+        """Version a full load; call with self._lock held"""
+        loaded_at, products = loaded[:2]
+        self._version += 1
+        # Periodic reloads usually find Products unchanged; keep the version so nothing keyed on it is rebuilt
+        if self._snapshot is None or products != self._snapshot.products:
+            self._products_version += 1
+        self._reload_due = loaded_at + self.max_age
+        return CatalogSnapshot(self._version, self._products_version, *loaded)
+
+    def _incremental_load(self, snap, product_ids, inventory_ids, seller_ids, discounts_changed):
+        products = dict(snap.products)
+        inventory = dict(snap.inventory)
+        by_product = dict(snap.by_product)
+        touched = set()
+        added = {}  # productID -> inventoryIDs loaded in this refresh
+
+        def drop_inventory(iid):
+            row = inventory.pop(iid, None)
+            if row is not None:
+                touched.add(row['productID'])
+
+        def put_inventory(row):
+            drop_inventory(row['inventoryID'])
+            inventory[row['inventoryID']] = row
+            touched.add(row['productID'])
+            added.setdefault(row['productID'], set()).add(row['inventoryID'])
+
+        if product_ids:
+            ids = list(product_ids)
+            for pid in ids:
+                products.pop(pid, None)
+                for iid in snap.by_product.get(pid, ()):
+                    drop_inventory(iid)
+                touched.add(pid)
+            for row in execute_query(f"SELECT * FROM Products WHERE productID IN ({_in_clause(ids)})", ids, fetch=True):
+                products[row['productID']] = row
+            for row in execute_query(self._INVENTORY_QUERY + f" AND i.productID IN ({_in_clause(ids)})", ids, fetch=True):
+                put_inventory(row)
+
+        if inventory_ids:
+            ids = list(inventory_ids)
+            for iid in ids:
+                drop_inventory(iid)
+            for row in execute_query(self._INVENTORY_QUERY + f" AND i.inventoryID IN ({_in_clause(ids)})", ids, fetch=True):
+                put_inventory(row)
+
+        if seller_ids:
+            ids = list(seller_ids)
+            for iid in [iid for iid, row in inventory.items() if row['sellerID'] in seller_ids]:
+                drop_inventory(iid)
+            for row in execute_query(self._INVENTORY_QUERY + f" AND i.sellerID IN ({_in_clause(ids)})", ids, fetch=True):
+                put_inventory(row)
+
+        # Re-derive offers only for the products whose rows or inventory changed
+        offers = dict(snap.offers)
+        best_offers = dict(snap.best_offers)
+        live = list(snap.live)
+        for pid in touched:
+            for iid in snap.by_product.get(pid, ()):
+                old = offers.pop(iid, None)
+                if old is not None and old['currentStock'] > 0:
+                    key = _offer_key(old)
+                    pos = bisect.bisect_left(live, key)
+                    if pos < len(live) and live[pos] == key:
+                        del live[pos]
+            kept = {iid for iid in snap.by_product.get(pid, ()) if iid in inventory}
+            iids = tuple(sorted(kept | added.get(pid, set())))
+            if iids:
+                by_product[pid] = iids
+            else:
+                by_product.pop(pid, None)
+            best_offers.pop(pid, None)
+            product = products.get(pid)
+            if product is None:
+                continue
+            for iid in iids:
+                offers[iid] = offer = {**product, **inventory[iid]}
+                if offer['currentStock'] > 0:
+                    bisect.insort(live, _offer_key(offer))
+            best = _pick_best_offer([offers[iid] for iid in iids])
+            if best is not None:
+                best_offers[pid] = best
+
+        categories = snap.categories
+        if product_ids:
+            categories = sorted({p['productCategory'] for p in products.values()})
+        discounts = self._load_discounts() if discounts_changed else snap.discounts
+
+        self._version += 1
+        if product_ids:
+            self._products_version += 1
+        return CatalogSnapshot(self._version, self._products_version, snap.loaded_at, products, inventory, by_product,
+                               offers, best_offers, live, categories, discounts)
+
+catalog = Catalog()
+
 def login_required(role=None):
     def decorator(f):
         def wrapper(*args, **kwargs):
@@ -59,12 +1062,125 @@ def login_required(role=None):
         return wrapper
     return decorator
 
+# Password hashing
+# Hashing is CPU-bound and holds the GIL, so it runs in worker processes. A bounded number of
+# jobs may be in flight; past that, callers wait briefly and are then turned away.
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'   # full method string, compared against stored hash prefixes
+PASSWORD_HASH_WORKERS = os.cpu_count() or 1
+PASSWORD_HASH_MAX_PENDING = PASSWORD_HASH_WORKERS * 4
+PASSWORD_HASH_ADMISSION_TIMEOUT = 2.0       # seconds to wait for a free slot before refusing
+PASSWORD_HASH_TIMEOUT = 30                  # seconds before a hashing job is given up on
+
+PASSWORD_HASH_ADMISSION_WAIT = Histogram('shopease_password_hash_admission_wait_seconds',
+                                         'Time spent waiting for a free password hashing slot',
+                                         buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0))
+PASSWORD_HASH_DURATION = Histogram('shopease_password_hash_seconds', 'Password hashing time including pool queueing',
+                                   ['operation'], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+PASSWORD_HASH_IN_FLIGHT = Gauge('shopease_password_hash_in_flight', 'Password hashing jobs queued or running',
+                                multiprocess_mode='livesum')
+PASSWORD_HASH_REJECTED = Counter('shopease_password_hash_rejected_total', 'Hashing jobs refused because the pool was full')
+
+if __name__ == '__main__' and __spec__ is None:
+    # Started as `python __main__.py`: spawn would re-run this whole file in every hash worker (as
+    # __mp_main__). Give it the spec `python .` does; multiprocessing never re-imports a __main__ module.
+    __spec__ = importlib.machinery.ModuleSpec('__main__', None)
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs werkzeug password hashing on a process pool with an admission limit"""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 admission_timeout=PASSWORD_HASH_ADMISSION_TIMEOUT, method=PASSWORD_HASH_METHOD):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.admission_timeout = admission_timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._counters = {'submitted': 0, 'rejected': 0, 'pool_restarts': 0}
+
+    def hash(self, password):
+        return self._run('hash', password_worker.hash_password, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run('verify', password_worker.verify_password, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        return stats
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the web process has threads (pool, activity flusher) that fork would copy mid-flight
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=password_worker.init_worker)
+            return self._pool
+
+    def _run(self, operation, fn, *args):
+        start = time.perf_counter()
+        admitted = self._slots.acquire(timeout=self.admission_timeout)
+        PASSWORD_HASH_ADMISSION_WAIT.observe(time.perf_counter() - start)
+        if not admitted:
+            PASSWORD_HASH_REJECTED.inc()
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PasswordHasherBusy('Too many password operations in progress')
+
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            with self._lock:
+                self._counters['submitted'] += 1
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result(timeout=PASSWORD_HASH_TIMEOUT)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next caller
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                        self._counters['pool_restarts'] += 1
+                raise
+        finally:
+            PASSWORD_HASH_IN_FLIGHT.dec()
+            PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - start)
+            self._slots.release()
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
+
+# Loyalty points are cached in the session and re-read once the cached value is this old, which
+# picks up changes made through other workers, devices or the database
+LOYALTY_POINTS_TTL = 60   # seconds
+
+def cache_loyalty_points(points):
+    session['loyalty_points'] = points
+    session['loyalty_points_at'] = int(time.time())
+
 @app.before_request
 def load_user_data():
     if 'user_id' in session and session.get('role') == 'customer':
+        if 'loyalty_points' in session and time.time() - session.get('loyalty_points_at', 0) < LOYALTY_POINTS_TTL:
+            return
         user = execute_query("SELECT loyaltyPoints FROM Users WHERE userID = %s", (session['user_id'],), fetch=True)
         if user:
-            session['loyalty_points'] = user[0]['loyaltyPoints']
+            cache_loyalty_points(user[0]['loyaltyPoints'])
 
 # Authentication Routes
 @app.route('/')
@@ -88,11 +1204,29 @@ def login():
             (email,), fetch=True
         )
         
-        if user and check_password_hash(user[0]['password'], password):
+        try:
+            valid = bool(user) and password_hasher.verify(user[0]['password'], password)
+        except PasswordHasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment', 'error')
+            return render_template('login.html'), 503
+        
+        if valid and password_hasher.needs_rehash(user[0]['password']):
+            # Upgrade hashes made with older parameters while we have the plaintext; retried next login if busy
+            try:
+                execute_query(
+                    "UPDATE Users SET password = %s WHERE userID = %s AND password = %s",
+                    (password_hasher.hash(password), user[0]['userID'], user[0]['password'])
+                )
+            except PasswordHasherBusy:
+                pass
+        
+        if valid:
             session['user_id'] = user[0]['userID']
             session['name'] = user[0]['name']
             session['role'] = user[0]['role']
             session['email'] = user[0]['email']
+            if user[0]['role'] == 'customer':
+                cache_loyalty_points(user[0]['loyaltyPoints'])
             
             role = user[0]['role']
             if role == 'customer':
@@ -127,12 +1261,18 @@ def signup():
             flash('Email already exists', 'error')
             return render_template('signup.html')
         
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            flash('Too many sign-ups right now, please try again in a moment', 'error')
+            return render_template('signup.html'), 503
         
         execute_query(
             "INSERT INTO Users (name, email, phone, password, role, address, joinDate, loyaltyPoints, status) VALUES (%s, %s, %s, %s, %s, %s, %s, 0, 'active')",
             (name, email, phone, hashed_password, role, address, datetime.now())
         )
+        if role != 'admin':
+            increment_counter('total_users')
         
         flash('Account created successfully! Please login.', 'success')
         return redirect(url_for('login'))
@@ -160,27 +1300,17 @@ def logout():
 @app.route('/customer/home')
 @login_required('customer')
 def customer_home():
-    top_products = execute_query("""
-        SELECT p.*, i.pricePerUnit, i.currentStock, i.inventoryID, u.name as seller_name
-        FROM Products p 
-        JOIN Inventory i ON p.productID = i.productID 
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE i.currentStock > 0 AND u.status = 'active'
-        ORDER BY p.dateAdded DESC LIMIT 4
-    """, fetch=True)
- 
-    categories = execute_query(
-        "SELECT DISTINCT productCategory FROM Products ORDER BY productCategory",
-        fetch=True
-    )
-    
-    discounts = execute_query("""
-        SELECT * FROM Discounts 
-        WHERE startDate <= %s AND endDate >= %s AND useLimit > 0
-        LIMIT 5
-    """, (datetime.now(), datetime.now()), fetch=True)
+    snap = catalog.snapshot()
+    top_products = snap.top_products(4)
+    categories = snap.category_list()
+    discounts = snap.active_discounts(datetime.now(), limit=5)
     
-    recommended_products = get_recommended_products(session['user_id'], limit=4)
+    # The rest of the page is in memory; recommendations are the only read, and optional
+    try:
+        recommended_products = get_recommended_products(session['user_id'], 4)
+    except Exception as e:
+        print(f"Error loading recommendations: {e}")
+        recommended_products = []
     
     return render_template('customer/home.html', 
                          top_products=top_products, 
@@ -188,45 +1318,239 @@ def customer_home():
                          discounts=discounts,
                          recommended_products=recommended_products)
 
+# Product ratings
+# ProductRatingStats holds each product's review count, rating total and star histogram. add_review
+# updates it in the same transaction as the insert, so the product page never aggregates reviews.
+RATING_STARS = (5, 4, 3, 2, 1)
+
+_RATING_STATS_ADD = """
+    INSERT INTO ProductRatingStats
+        (productID, reviewCount, ratingTotal, rating1, rating2, rating3, rating4, rating5, lastReview)
+    VALUES (%s, 1, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        reviewCount = reviewCount + 1,
+        ratingTotal = ratingTotal + VALUES(ratingTotal),
+        rating1 = rating1 + VALUES(rating1),
+        rating2 = rating2 + VALUES(rating2),
+        rating3 = rating3 + VALUES(rating3),
+        rating4 = rating4 + VALUES(rating4),
+        rating5 = rating5 + VALUES(rating5),
+        lastReview = GREATEST(COALESCE(lastReview, VALUES(lastReview)), VALUES(lastReview))
+"""
+
+def add_rating(cursor, product_id, rating, feedback_date):
+    """Count one new review in ProductRatingStats, inside the caller's transaction"""
+    cursor.execute(_RATING_STATS_ADD, (product_id, rating, *[int(rating == star) for star in range(1, 6)],
+                                       feedback_date))
+
+def rebuild_rating_stats():
+    """Recompute every product's rating aggregates from ProductReview"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        cursor.execute("DELETE FROM ProductRatingStats")
+        cursor.execute("""
+            INSERT INTO ProductRatingStats
+                (productID, reviewCount, ratingTotal, rating1, rating2, rating3, rating4, rating5, lastReview)
+            SELECT productID, COUNT(*), SUM(rating),
+                   SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+                   MAX(feedbackDate)
+            FROM ProductReview
+            GROUP BY productID
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def rating_summary(stats):
+    """Average and star histogram for a ProductRatingStats row (None when there are no reviews)"""
+    count = (stats['reviewCount'] or 0) if stats else 0
+    return {
+        'count': count,
+        'average': round(stats['ratingTotal'] / count, 1) if count else None,
+        'histogram': [(star, stats[f'rating{star}'] if count else 0,
+                       round(100 * stats[f'rating{star}'] / count) if count else 0) for star in RATING_STARS]
+    }
+
+def review_cursor_key(review):
+    return review['feedbackDate'], review['userID']
+
+def product_reviews_page(product_id, after=None, limit=PAGE_SIZE):
+    """One page of a product's reviews, newest first, walking idx_product_reviews"""
+    condition, params = '', []
+    if after:
+        condition = " AND (feedbackDate < %s OR (feedbackDate = %s AND userID < %s))"
+        params = [after[0], after[0], after[1]]
+    reviews = execute_query(f"""
+        SELECT pr.*, u.name as customer_name
+        FROM (
+            SELECT * FROM ProductReview
+            WHERE productID = %s{condition}
+            ORDER BY feedbackDate DESC, userID DESC
+            LIMIT %s
+        ) pr
+        JOIN Users u ON pr.userID = u.userID
+        ORDER BY pr.feedbackDate DESC, pr.userID DESC
+    """, (product_id, *params, limit + 1), fetch=True)
+    return keyset_page(reviews, limit, review_cursor_key)
+
+# Product page caching
+# The shared parts of a product page are rendered once per content version and reused for every
+# customer; the wishlist buttons are rendered per request. Repeat views revalidate with the ETag.
+FRAGMENT_CACHE_SIZE = 5000
+FRAGMENT_CACHE_TTL = 300     # seconds; bounds staleness of things outside the version (e.g. a renamed reviewer)
+PRODUCT_INFO_FIELDS = ('inventoryID', 'productName', 'brand', 'productCategory', 'pricePerUnit',
+                       'currentStock', 'seller_name')
+PRODUCT_PAGE_TEMPLATES = ('base.html', 'customer/product_detail.html', 'customer/_product_info.html',
+                          'customer/_product_reviews.html')
+
+FRAGMENT_CACHE_REQUESTS = Counter('shopease_fragment_cache_requests_total', 'Fragment cache lookups',
+                                  ['fragment', 'result'])
+FRAGMENT_RENDER_SAVED = Counter('shopease_fragment_render_saved_seconds_total',
+                                'Render time avoided by fragment cache hits', ['fragment'])
+NOT_MODIFIED = Counter('shopease_not_modified_total', 'Conditional GETs answered with 304', ['endpoint'])
+
+class FragmentCache:
+    """LRU cache of rendered template fragments keyed by (fragment, key)"""
+
+    def __init__(self, max_size=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (fragment, key) -> (html, render_time, expires)
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'render_time': 0.0, 'saved_time': 0.0}
+
+    def render(self, fragment, key, template, context):
+        """Rendered HTML for the key; context() is only called on a miss"""
+        cache_key = (fragment, key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(cache_key)
+                self._counters['hits'] += 1
+                self._counters['saved_time'] += entry[1]
+                FRAGMENT_CACHE_REQUESTS.labels(fragment, 'hit').inc()
+                FRAGMENT_RENDER_SAVED.labels(fragment).inc(entry[1])
+                return entry[0]
+
+        start = time.perf_counter()
+        html = Markup(render_template(template, **context()))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._entries[cache_key] = (html, elapsed, now + self.ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+            self._counters['misses'] += 1
+            self._counters['render_time'] += elapsed
+        FRAGMENT_CACHE_REQUESTS.labels(fragment, 'miss').inc()
+        return html
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['avg_render_time'] = stats['render_time'] / stats['misses'] if stats['misses'] else 0.0
+        stats['max_size'] = self.max_size
+        stats['ttl'] = self.ttl
+        return stats
+
+fragment_cache = FragmentCache()
+_template_digest = {}
+
+def templates_digest(names):
+    """Digest of the template sources, so a deploy that changes a template changes the ETag"""
+    names = tuple(names)
+    digest = _template_digest.get(names)
+    if digest is None:
+        sha = hashlib.sha1()
+        for name in names:
+            source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+            sha.update(source.encode())
+        digest = _template_digest[names] = sha.hexdigest()
+    return digest
+
+def product_info_version(product):
+    return tuple(product[field] for field in PRODUCT_INFO_FIELDS)
+
+def product_page_etag(*parts):
+    return hashlib.sha1(repr((templates_digest(PRODUCT_PAGE_TEMPLATES), ASSET_VERSION) + parts).encode()).hexdigest()
+
+def not_modified(etag):
+    response = Response(status=304)
+    # Weak when the full page would have gone out compressed, matching the validator sent with it
+    response.set_etag(etag, weak=choose_encoding() is not None)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    NOT_MODIFIED.labels(request.endpoint).inc()
+    return response
+
 @app.route('/customer/product/<int:product_id>')
 @login_required('customer')
 def product_detail(product_id):
-    product = execute_query("""
-        SELECT p.*, i.pricePerUnit, i.currentStock, i.inventoryID, u.name as seller_name
-        FROM Products p 
-        JOIN Inventory i ON p.productID = i.productID 
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE p.productID = %s AND u.status = 'active'
-    """, (product_id,), fetch=True)
+    snap = catalog.snapshot()
+    # Show the best live offer; fall back to an out-of-stock one so the page still renders
+    product = snap.best_offer(product_id) or next(iter(snap.product_offers(product_id)), None)
     
     if not product:
         flash('Product not found', 'error')
         return redirect(url_for('customer_home'))
     
-    product = product[0]
-    
     # Track product view activity
     track_user_activity(session['user_id'], product['inventoryID'], 'view')
     
-    # Check if product is in wishlist
-    in_wishlist = execute_query(
-        "SELECT * FROM Wishlist WHERE userID = %s AND productID = %s",
-        (session['user_id'], product_id), fetch=True
+    # Rating aggregates and wishlist state in one round trip; both are primary key lookups
+    state = execute_query("""
+        SELECT rs.*, EXISTS (SELECT 1 FROM Wishlist WHERE userID = %s AND productID = %s) as inWishlist
+        FROM (SELECT %s as productID) p
+        LEFT JOIN ProductRatingStats rs ON rs.productID = p.productID
+    """, (session['user_id'], product_id, product_id), fetch=True)[0]
+    info_version = product_info_version(product)
+    review_version = (state['reviewCount'] or 0, state['lastReview'])
+    in_wishlist = bool(state['inWishlist'])
+    after = decode_cursor(request.args.get('after', ''), datetime, int)
+    
+    # Pending flash messages are part of the page, so such responses are never revalidated
+    conditional = '_flashes' not in session
+    etag = product_page_etag(product_id, info_version, review_version, in_wishlist, session['user_id'])
+    if conditional and request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    info_html = fragment_cache.render(
+        'product_info', (product_id, info_version), 'customer/_product_info.html',
+        lambda: {'product': product}
     )
+    def reviews_context():
+        reviews, next_cursor = product_reviews_page(product_id, after)
+        return {'product_id': product_id, 'reviews': reviews, 'next_cursor': next_cursor,
+                'paged': after is not None, 'rating': rating_summary(state)}
     
-    # Get reviews
-    reviews = execute_query("""
-        SELECT pr.*, u.name as customer_name
-        FROM ProductReview pr
-        JOIN Users u ON pr.userID = u.userID
-        WHERE pr.productID = %s
-        ORDER BY pr.feedbackDate DESC
-    """, (product_id,), fetch=True)
+    reviews_html = fragment_cache.render(
+        'product_reviews', (product_id, review_version, after), 'customer/_product_reviews.html', reviews_context
+    )
     
-    return render_template('customer/product_detail.html', 
-                         product=product, 
-                         reviews=reviews, 
-                         in_wishlist=bool(in_wishlist))
+    response = app.make_response(render_template('customer/product_detail.html', 
+                                                  product=product, 
+                                                  info_html=info_html,
+                                                  reviews_html=reviews_html,
+                                                  in_wishlist=in_wishlist))
+    if conditional:
+        # ETag only: the wishlist button and per-worker render times have no Last-Modified that covers them
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+        if response.status_code == 304:
+            NOT_MODIFIED.labels(request.endpoint).inc()
+    return response
 
 @app.route('/customer/add_to_cart', methods=['POST'])
 @login_required('customer')
@@ -238,13 +1562,22 @@ def add_to_cart():
         return redirect(request.referrer or url_for('customer_home'))
     
     inventory_id = int(inventory_id)
-    inventory_check = execute_query("""
-        SELECT i.*, p.productName 
-        FROM Inventory i 
-        JOIN Products p ON i.productID = p.productID
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE i.inventoryID = %s AND i.currentStock > 0 AND u.status = 'active'
-    """, (inventory_id,), fetch=True)
+    existing = execute_query(
+        "SELECT * FROM Cart WHERE userID = %s AND inventoryID = %s",
+        (session['user_id'], inventory_id), fetch=True
+    )
+    offer = catalog.snapshot().offer(inventory_id)
+    if not offer or offer['currentStock'] < quantity + (existing[0]['quantity'] if existing else 0):
+        # The snapshot can be CATALOG_MAX_AGE seconds old; check the row itself before turning the customer away
+        offer = execute_query("""
+            SELECT i.currentStock, p.productName
+            FROM Inventory i
+            JOIN Products p ON i.productID = p.productID
+            JOIN Users u ON i.sellerID = u.userID
+            WHERE i.inventoryID = %s AND u.status = 'active'
+        """, (inventory_id,), fetch=True)
+        offer = offer[0] if offer else None
+    inventory_check = [offer] if offer and offer['currentStock'] > 0 else []
     
     if not inventory_check:
         flash('Product not available', 'error')
@@ -252,10 +1585,6 @@ def add_to_cart():
     if quantity > inventory_check[0]['currentStock']:
         flash(f'Only {inventory_check[0]["currentStock"]} items available', 'error')
         return redirect(request.referrer or url_for('customer_home'))
-    existing = execute_query(
-        "SELECT * FROM Cart WHERE userID = %s AND inventoryID = %s",
-        (session['user_id'], inventory_id), fetch=True
-    )
     
     try:
         if existing:
@@ -285,23 +1614,13 @@ def add_to_cart():
 @app.route('/customer/cart')
 @login_required('customer')
 def view_cart():
-    cart_items = execute_query("""
-        SELECT c.*, p.productName, i.pricePerUnit, i.currentStock,
-               (c.quantity * i.pricePerUnit) as total_price
-        FROM Cart c
-        JOIN Inventory i ON c.inventoryID = i.inventoryID
-        JOIN Products p ON i.productID = p.productID
-        WHERE c.userID = %s
-    """, (session['user_id'],), fetch=True)
-    subtotal = currency_round(sum(Decimal(str(item['total_price'])) for item in cart_items))
-    delivery_charge = DELIVERY_CHARGE if cart_items else Decimal('0.00')
-    total_amount = currency_round(subtotal + delivery_charge)
+    quote = get_cart_quote(session['user_id'])
     
     return render_template('customer/cart.html', 
-                         cart_items=cart_items, 
-                         subtotal=float(subtotal), 
-                         delivery_charge=float(delivery_charge),
-                         total_amount=float(total_amount)) 
+                         cart_items=quote.lines, 
+                         subtotal=float(quote.subtotal), 
+                         delivery_charge=float(quote.delivery_charge),
+                         total_amount=float(quote.total_amount)) 
 
 @app.route('/customer/update_cart', methods=['POST'])
 @login_required('customer')
@@ -322,50 +1641,314 @@ def update_cart():
     
     return redirect(url_for('view_cart'))
 
-@app.route('/customer/checkout')
-@login_required('customer')
-def checkout():
-    cart_items = execute_query("""
-        SELECT c.*, p.productName, i.pricePerUnit,
+# Discount redemption
+# A discount's remaining uses are split over DISCOUNT_SLOTS rows. Each redemption locks one row that
+# no one else holds, so concurrent checkouts with the same code don't queue behind each other.
+DISCOUNT_SLOTS = 16   # keep in sync with the backfill at the end of sample_data.sql
+
+def normalize_discount_code(code):
+    return code.strip().upper()
+
+# Uses left: a slot with some remaining, or no slots yet. Discounts created before the slot table
+# existed get theirs on their first redemption (see redeem_discount).
+DISCOUNT_HAS_USES = """(
+    EXISTS (SELECT 1 FROM DiscountUseSlots s WHERE s.discountID = d.discountID AND s.remaining > 0)
+    OR (d.useLimit > 0 AND NOT EXISTS (SELECT 1 FROM DiscountUseSlots s WHERE s.discountID = d.discountID))
+)"""
+
+def allocate_discount_slots(cursor, discount_id, use_limit, slots=DISCOUNT_SLOTS):
+    base, extra = divmod(use_limit, slots)
+    # IGNORE: two first redemptions of an older discount may both try to create its slots
+    cursor.executemany(
+        "INSERT IGNORE INTO DiscountUseSlots (discountID, slot, remaining) VALUES (%s, %s, %s)",
+        [(discount_id, slot, base + (slot < extra)) for slot in range(slots)]
+    )
+
+def ensure_discount_slots(cursor, discount_id):
+    """Create the slots of a discount that had none, from its useLimit.
+
+    True when the slots exist now and are worth another look, whether this call created them
+    or a concurrent first redemption did (its rows are waited for, then ignored). False when
+    the discount already had slots or has no useLimit.
+    """
+    cursor.execute("SELECT COUNT(*) AS slots FROM DiscountUseSlots WHERE discountID = %s", (discount_id,))
+    row = cursor.fetchone()
+    if (row['slots'] if isinstance(row, dict) else row[0]) > 0:
+        return False
+    cursor.execute("SELECT useLimit FROM Discounts WHERE discountID = %s", (discount_id,))
+    row = cursor.fetchone()
+    use_limit = (row['useLimit'] if isinstance(row, dict) else row[0]) if row else None
+    if not use_limit or use_limit <= 0:
+        return False
+    allocate_discount_slots(cursor, discount_id, use_limit)
+    return True
+
+_DISCOUNT_SLOT_QUERY = """
+    SELECT s.slot FROM DiscountUseSlots s
+    JOIN Discounts d ON s.discountID = d.discountID
+    WHERE s.discountID = %s AND s.slot {range} %s AND s.remaining > 0
+      AND d.startDate <= %s AND d.endDate >= CURDATE()
+    ORDER BY s.slot
+    LIMIT 1
+    FOR UPDATE OF s {wait}
+"""
+
+def redeem_discount(cursor, discount_id):
+    """Use up one redemption inside the caller's transaction; False if none are left.
+
+    Starts at a random slot and skips slots other transactions hold. Only if every
+    slot with uses left is busy does it wait, so a code never looks used up while
+    uses remain and the remaining counts can't go below zero.
+    """
+    if _take_discount_slot(cursor, discount_id):
+        return True
+    # Only reached when nothing is left, or for an older discount that has no slots yet
+    return ensure_discount_slots(cursor, discount_id) and _take_discount_slot(cursor, discount_id)
+
+def _take_discount_slot(cursor, discount_id):
+    start = secrets.randbelow(DISCOUNT_SLOTS)
+    now = datetime.now()
+    for wait in ('SKIP LOCKED', ''):
+        for range_op in ('>=', '<'):
+            cursor.execute(_DISCOUNT_SLOT_QUERY.format(range=range_op, wait=wait), (discount_id, start, now))
+            row = cursor.fetchone()
+            if row:
+                slot = row['slot'] if isinstance(row, dict) else row[0]
+                cursor.execute(
+                    "UPDATE DiscountUseSlots SET remaining = remaining - 1 WHERE discountID = %s AND slot = %s",
+                    (discount_id, slot)
+                )
+                return True
+    return False
+
+# Cart pricing
+QUOTE_CACHE_SIZE = 10000
+MAX_DISCOUNT_SHARE = Decimal('0.5')   # percentage discounts never take more than half the subtotal
+
+class CartQuote:
+    """Priced cart: the lines plus every total shown from the cart page to the order"""
+
+    def __init__(self, lines, subtotal, discount_amount, delivery_charge):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.discount_amount = discount_amount
+        self.discounted_subtotal = currency_round(subtotal - discount_amount)
+        self.delivery_charge = delivery_charge
+        self.total_amount = currency_round(self.discounted_subtotal + delivery_charge)
+        self.loyalty_points = int(self.discounted_subtotal * LOYALTY_POINTS_RATE)
+
+    def summary(self):
+        return {
+            'items': [{
+                'inventory_id': line['inventoryID'],
+                'product_name': line['productName'],
+                'quantity': line['quantity'],
+                'price': float(line['pricePerUnit']),
+                'total_price': float(line['quantity'] * line['pricePerUnit']),
+                'current_stock': line['currentStock']
+            } for line in self.lines],
+            'item_count': sum(line['quantity'] for line in self.lines),
+            'subtotal': float(self.subtotal),
+            'discount_amount': float(self.discount_amount),
+            'delivery_charge': float(self.delivery_charge),
+            'total_amount': float(self.total_amount),
+            'loyalty_points': self.loyalty_points
+        }
+
+def price_cart(lines, discount=None):
+    """Price cart lines (quantity, pricePerUnit) with an optional applied discount"""
+    subtotal = currency_round(sum(line['quantity'] * Decimal(line['pricePerUnit']) for line in lines))
+    discount_amount = Decimal('0.00')
+    if discount:
+        value = Decimal(str(discount['discountValue']))
+        if discount['discountType'] == 'percentage':
+            discount_amount = min(subtotal * value / Decimal('100'), subtotal * MAX_DISCOUNT_SHARE)
+        else:
+            discount_amount = min(value, subtotal)
+        discount_amount = currency_round(discount_amount)
+    delivery_charge = DELIVERY_CHARGE if lines else Decimal('0.00')
+    return CartQuote(lines, subtotal, discount_amount, delivery_charge)
+
+_quote_cache = OrderedDict()
+_quote_cache_lock = threading.Lock()
+
+def cart_contents(lines):
+    """The (inventoryID, quantity) pairs a quote was priced from"""
+    return tuple(sorted((line['inventoryID'], line['quantity']) for line in lines))
+
+def _quote_key(user_id, lines, discount, catalog_version=None):
+    # Keyed on the cart rows themselves, so a cleared session or a second device never gets another
+    # cart's quote. The catalog version moves whenever a price, stock level or seller status changes.
+    # Callers inside a transaction pass the version they read before it: snapshot() may refresh.
+    if catalog_version is None:
+        catalog_version = catalog.snapshot().version
+    return (user_id, cart_contents(lines), catalog_version, discount['discountID'] if discount else None)
+
+def cached_cart_quote(user_id, lines, discount=None, catalog_version=None):
+    with _quote_cache_lock:
+        return _quote_cache.get(_quote_key(user_id, lines, discount, catalog_version))
+
+def discard_cart_quote(user_id, lines, discount=None, catalog_version=None):
+    with _quote_cache_lock:
+        _quote_cache.pop(_quote_key(user_id, lines, discount, catalog_version), None)
+
+def get_cart_quote(user_id, discount=None):
+    """The user's priced cart, computed once per cart contents and reused across steps"""
+    contents = execute_query("SELECT inventoryID, quantity FROM Cart WHERE userID = %s", (user_id,), fetch=True)
+    key = _quote_key(user_id, contents, discount)
+    with _quote_cache_lock:
+        quote = _quote_cache.get(key)
+        if quote is not None:
+            _quote_cache.move_to_end(key)
+            return quote
+    lines = execute_query("""
+        SELECT c.*, p.productName, i.pricePerUnit, i.currentStock,
                (c.quantity * i.pricePerUnit) as total_price
         FROM Cart c
         JOIN Inventory i ON c.inventoryID = i.inventoryID
         JOIN Products p ON i.productID = p.productID
         WHERE c.userID = %s
-    """, (session['user_id'],), fetch=True)
+    """, (user_id,), fetch=True)
+    quote = price_cart(lines, discount)
+    key = _quote_key(user_id, lines, discount)   # the cart may have changed since the first read
+    with _quote_cache_lock:
+        _quote_cache[key] = quote
+        while len(_quote_cache) > QUOTE_CACHE_SIZE:
+            _quote_cache.popitem(last=False)
+    return quote
+
+# Cart API
+CART_API_MAX_OPS = 50
+CART_OPS = {'add', 'set', 'remove'}
+
+# Each operation is one statement; the stock guard lives in the SELECT / IF so nothing is read first.
+# With the default client flags an upsert that changes nothing reports 0 rows, which is how a
+# refused line shows up.
+_CART_ADD = """
+    INSERT INTO Cart (userID, inventoryID, quantity, dateAdded)
+    SELECT %s, i.inventoryID, %s, %s
+    FROM Inventory i
+    JOIN Users u ON i.sellerID = u.userID
+    WHERE i.inventoryID = %s AND i.currentStock >= %s AND u.status = 'active'
+    ON DUPLICATE KEY UPDATE quantity = IF(Cart.quantity + VALUES(quantity) <= i.currentStock,
+                                          Cart.quantity + VALUES(quantity), Cart.quantity)
+"""
+_CART_SET = """
+    INSERT INTO Cart (userID, inventoryID, quantity, dateAdded)
+    SELECT %s, i.inventoryID, %s, %s
+    FROM Inventory i
+    JOIN Users u ON i.sellerID = u.userID
+    WHERE i.inventoryID = %s AND i.currentStock >= %s AND u.status = 'active'
+    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+"""
+_CART_REMOVE = "DELETE FROM Cart WHERE userID = %s AND inventoryID = %s"
+
+def parse_cart_ops(payload):
+    """Normalise {"ops": [...]} or a single op object into (op, inventory_id, quantity) tuples"""
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object')
+    ops = payload.get('ops', [payload])
+    if not isinstance(ops, list) or not ops:
+        raise ValueError('No cart operations given')
+    if len(ops) > CART_API_MAX_OPS:
+        raise ValueError(f'At most {CART_API_MAX_OPS} operations per request')
+    parsed = []
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in CART_OPS:
+            raise ValueError('Each operation needs an op of add, set or remove')
+        try:
+            inventory_id = int(op.get('inventory_id'))
+            quantity = int(op.get('quantity', 1 if op['op'] == 'add' else 0))
+        except (TypeError, ValueError):
+            raise ValueError('inventory_id and quantity must be integers')
+        if quantity < 0 or (op['op'] == 'add' and quantity == 0):
+            raise ValueError('Quantity must be positive')
+        if op['op'] == 'set' and quantity == 0:
+            op = dict(op, op='remove')
+        parsed.append((op['op'], inventory_id, quantity))
+    return parsed
+
+@app.route('/api/cart', methods=['POST'])
+@login_required('customer')
+def cart_api():
+    """Apply one or more cart changes in a single transaction and return the updated cart"""
+    try:
+        ops = parse_cart_ops(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    if not cart_items:
-        flash('Cart is empty', 'error')
-        return redirect(url_for('view_cart'))
+    user_id = session['user_id']
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    now = datetime.now()
+    applied = []
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        for op, inventory_id, quantity in ops:
+            if op == 'add':
+                cursor.execute(_CART_ADD, (user_id, quantity, now, inventory_id, quantity))
+            elif op == 'set':
+                cursor.execute(_CART_SET, (user_id, quantity, now, inventory_id, quantity))
+            else:
+                cursor.execute(_CART_REMOVE, (user_id, inventory_id))
+            applied.append(cursor.rowcount)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error in cart_api: {e}")
+        return jsonify({'success': False, 'message': 'Error updating cart'}), 500
+    finally:
+        cursor.close()
     
-    subtotal = currency_round(sum(Decimal(str(item['total_price'])) for item in cart_items))
-    discount_amount = Decimal('0.00')
+    quote = get_cart_quote(user_id)
+    quantities = {item['inventoryID']: item['quantity'] for item in quote.lines}
+    snap = catalog.snapshot()
+    results = []
+    for (op, inventory_id, quantity), rowcount in zip(ops, applied):
+        # 0 rows from a set can also mean the quantity was already what was asked for
+        ok = rowcount > 0 or op == 'remove' or (op == 'set' and quantities.get(inventory_id) == quantity)
+        result = {'op': op, 'inventory_id': inventory_id, 'success': ok,
+                  'quantity': quantities.get(inventory_id, 0)}
+        if not ok:
+            offer = snap.offer(inventory_id)
+            if offer and offer['currentStock'] > 0:
+                result['message'] = f'Only {offer["currentStock"]} {offer["productName"]} available'
+            else:
+                result['message'] = 'Product not available'
+        results.append(result)
     
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'results': results,
+        'cart': quote.summary()
+    })
+
+@app.route('/customer/checkout')
+@login_required('customer')
+def checkout():
     applied_discount = session.get('applied_discount')
-    if applied_discount:
-        if applied_discount['discountType'] == 'percentage':
-            discount_amount = subtotal * (Decimal(str(applied_discount['discountValue'])) / Decimal('100'))
-            discount_amount = min(discount_amount, subtotal * Decimal('0.5'))  # Max 50% discount
-        else:
-            discount_amount = min(Decimal(str(applied_discount['discountValue'])), subtotal)
-        
-        discount_amount = currency_round(discount_amount)
-        session['applied_discount']['discount_amount'] = float(discount_amount)
+    quote = get_cart_quote(session['user_id'], applied_discount)
+    
+    if not quote.lines:
+        flash('Cart is empty', 'error')
+        return redirect(url_for('view_cart'))
     
-    discounted_subtotal = currency_round(subtotal - discount_amount)
-    total_amount = currency_round(discounted_subtotal + DELIVERY_CHARGE)
-    earnable_points = int(discounted_subtotal * LOYALTY_POINTS_RATE)
+    if applied_discount and applied_discount.get('discount_amount') != float(quote.discount_amount):
+        session['applied_discount']['discount_amount'] = float(quote.discount_amount)
+        session.modified = True
     
     user = execute_query("SELECT * FROM Users WHERE userID = %s", (session['user_id'],), fetch=True)[0]
     
     return render_template('customer/checkout.html', 
-                         cart_items=cart_items, 
-                         subtotal=float(subtotal),
-                         discount_amount=float(discount_amount),
-                         discounted_subtotal=float(discounted_subtotal),
-                         delivery_charge=float(DELIVERY_CHARGE),
-                         total_amount=float(total_amount),
-                         earnable_points=earnable_points,
+                         cart_items=quote.lines, 
+                         subtotal=float(quote.subtotal),
+                         discount_amount=float(quote.discount_amount),
+                         discounted_subtotal=float(quote.discounted_subtotal),
+                         delivery_charge=float(quote.delivery_charge),
+                         total_amount=float(quote.total_amount),
+                         earnable_points=quote.loyalty_points,
                          applied_discount=applied_discount,
                          user=user)
 
@@ -373,42 +1956,30 @@ def checkout():
 @login_required('customer')
 def apply_discount():
     """Apply discount coupon to session"""
-    discount_code = request.form.get('discount_code', '').strip().upper()
+    discount_code = normalize_discount_code(request.form.get('discount_code', ''))
     
     if not discount_code:
         return jsonify({'success': False, 'message': 'Please enter a discount code'})
     
+    # Codes are stored upper-case, so a plain comparison can use idx_discount_code
     discount = execute_query("""
-        SELECT * FROM Discounts 
-        WHERE UPPER(discountCode) = %s 
-        AND startDate <= %s 
-        AND endDate >= %s 
-        AND useLimit > 0
+        SELECT d.* FROM Discounts d
+        WHERE d.discountCode = %s 
+        AND d.startDate <= %s 
+        AND d.endDate >= %s 
+        AND """ + DISCOUNT_HAS_USES + """
     """, (discount_code, datetime.now(), datetime.now()), fetch=True)
     
     if not discount:
         return jsonify({'success': False, 'message': 'Invalid or expired discount code'})
     
     discount = discount[0]
-    cart_items = execute_query("""
-        SELECT c.*, i.pricePerUnit, (c.quantity * i.pricePerUnit) as total_price
-        FROM Cart c
-        JOIN Inventory i ON c.inventoryID = i.inventoryID
-        WHERE c.userID = %s
-    """, (session['user_id'],), fetch=True)
+    quote = get_cart_quote(session['user_id'], discount)
     
-    if not cart_items:
+    if not quote.lines:
         return jsonify({'success': False, 'message': 'Your cart is empty'})
     
-    subtotal = currency_round(sum(Decimal(str(item['total_price'])) for item in cart_items))
-    
-    if discount['discountType'] == 'percentage':
-        discount_amount = subtotal * (Decimal(str(discount['discountValue'])) / Decimal('100'))
-        discount_amount = min(discount_amount, subtotal * Decimal('0.5'))
-    else:
-        discount_amount = min(Decimal(str(discount['discountValue'])), subtotal)
-    
-    discount_amount = currency_round(discount_amount)
+    discount_amount = quote.discount_amount
     
     session['applied_discount'] = {
         'discountID': discount['discountID'],
@@ -433,103 +2004,162 @@ def remove_discount():
     session.pop('applied_discount', None)
     return jsonify({'success': True, 'message': 'Discount removed'})
 
+PLACE_ORDER_ATTEMPTS = 2   # a checkout chosen as a deadlock victim is run once more
+MYSQL_DEADLOCK = 1213      # ER_LOCK_DEADLOCK
+
 @app.route('/customer/place_order', methods=['POST'])
 @login_required('customer')
 def place_order():
     delivery_address = request.form['delivery_address']
-    cart_items = execute_query("""
-        SELECT c.*, i.pricePerUnit
-        FROM Cart c
-        JOIN Inventory i ON c.inventoryID = i.inventoryID
-        WHERE c.userID = %s
-    """, (session['user_id'],), fetch=True)
-    
-    if not cart_items:
-        flash('Cart is empty', 'error')
-        return redirect(url_for('view_cart'))
-    
+    user_id = session['user_id']
     applied_discount = session.get('applied_discount')
     discount_id = applied_discount['discountID'] if applied_discount else None
+    # Read before the transaction, so no catalog refresh runs while the cart and stock rows are locked
+    catalog_version = catalog.snapshot().version
     
     conn = get_db_connection()
-    cursor = conn.cursor()
     
-    try:
-        cursor.execute(
-            "INSERT INTO Orders (userID, orderDate, orderStatus) VALUES (%s, %s, 'pending')",
-            (session['user_id'], datetime.now())
-        )
-        order_id = cursor.lastrowid
-        
-        subtotal = Decimal('0.00')
-        for item in cart_items:
-            item_total = Decimal(str(item['quantity'])) * Decimal(str(item['pricePerUnit']))
-            subtotal = currency_round(subtotal + item_total)
+    for attempt in range(1, PLACE_ORDER_ATTEMPTS + 1):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.start_transaction()
             
+            # Lock the cart lines and their inventory rows so price and stock can't change under us. Every
+            # checkout locks in inventoryID order, so two carts sharing products wait instead of deadlocking
             cursor.execute("""
-                INSERT INTO OrderItems (orderID, inventoryID, quantity, priceOnSale, discountID)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (order_id, item['inventoryID'], item['quantity'], float(Decimal(str(item['pricePerUnit']))), discount_id))
+                SELECT c.inventoryID, c.quantity, i.pricePerUnit, i.currentStock, p.productName
+                FROM Cart c
+                JOIN Inventory i ON c.inventoryID = i.inventoryID
+                JOIN Products p ON i.productID = p.productID
+                WHERE c.userID = %s
+                ORDER BY c.inventoryID
+                FOR UPDATE OF c, i
+            """, (user_id,))
+            cart_items = cursor.fetchall()
+            
+            if not cart_items:
+                conn.rollback()
+                flash('Cart is empty', 'error')
+                return redirect(url_for('view_cart'))
+            
+            # Decrement every line in one statement; lines without enough stock are left untouched
+            cursor.execute("""
+                UPDATE Inventory i
+                JOIN Cart c ON c.inventoryID = i.inventoryID
+                SET i.currentStock = i.currentStock - c.quantity
+                WHERE c.userID = %s AND i.currentStock >= c.quantity
+            """, (user_id,))
+            
+            if cursor.rowcount != len(cart_items):
+                conn.rollback()
+                short = [item for item in cart_items if item['currentStock'] < item['quantity']]
+                details = ', '.join(f"{item['productName']} ({item['currentStock']} left)" for item in short)
+                flash(f'Not enough stock for: {details}. Please update your cart.', 'error')
+                return redirect(url_for('view_cart'))
+            
+            # Price the locked rows; if that differs from what checkout showed, let the customer look again
+            quote = price_cart(cart_items, applied_discount)
+            shown = cached_cart_quote(user_id, cart_items, applied_discount, catalog_version)
+            if shown is not None and shown.total_amount != quote.total_amount:
+                conn.rollback()
+                discard_cart_quote(user_id, cart_items, applied_discount, catalog_version)
+                flash(f'Prices in your cart have changed, the new total is ৳{quote.total_amount:.2f}. '
+                      'Please review your order.', 'error')
+                return redirect(url_for('checkout'))
+            
+            if applied_discount and not redeem_discount(cursor, applied_discount['discountID']):
+                conn.rollback()
+                session.pop('applied_discount', None)
+                flash(f'Discount code {applied_discount["discountCode"]} is no longer available and has been removed. '
+                      'Please review your order.', 'error')
+                return redirect(url_for('checkout'))
             
+            now = datetime.now()
             cursor.execute(
-                "UPDATE Inventory SET currentStock = currentStock - %s WHERE inventoryID = %s",
-                (item['quantity'], item['inventoryID'])
+                "INSERT INTO Orders (userID, orderDate, orderStatus) VALUES (%s, %s, 'pending')",
+                (user_id, now)
             )
+            order_id = cursor.lastrowid
+            
+            # executemany batches these into a single multi-row INSERT
+            cursor.executemany("""
+                INSERT INTO OrderItems (orderID, inventoryID, quantity, priceOnSale, discountID)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [(order_id, item['inventoryID'], item['quantity'], item['pricePerUnit'], discount_id)
+                  for item in cart_items])
+            
             cursor.execute("""
                 INSERT INTO UserActivity (userID, inventoryID, activityType, activityDate)
-                VALUES (%s, %s, 'purchase', %s)
-            """, (session['user_id'], item['inventoryID'], datetime.now()))
-        
-        discount_amount = Decimal(str(applied_discount['discount_amount'])) if applied_discount else Decimal('0.00')
-        discounted_subtotal = currency_round(subtotal - discount_amount)
-        total_amount = currency_round(discounted_subtotal + DELIVERY_CHARGE)
-        
-        cursor.execute("""
-            INSERT INTO Payments (orderID, amount, paymentMethod, paymentStatus, transactionDate)
-            VALUES (%s, %s, 'cash_on_delivery', 'pending', %s)
-        """, (order_id, float(total_amount), datetime.now()))
-        
-        loyalty_points = int(discounted_subtotal * LOYALTY_POINTS_RATE)
-        cursor.execute(
-            "UPDATE Users SET loyaltyPoints = loyaltyPoints + %s WHERE userID = %s",
-            (loyalty_points, session['user_id'])
-        )
-        
-        if applied_discount:
+                SELECT userID, inventoryID, 'purchase', %s FROM Cart WHERE userID = %s
+            """, (now, user_id))
+            
+            discount_amount = quote.discount_amount
+            total_amount = quote.total_amount
+            
+            cursor.execute("""
+                INSERT INTO Payments (orderID, amount, paymentMethod, paymentStatus, transactionDate)
+                VALUES (%s, %s, 'cash_on_delivery', 'pending', %s)
+            """, (order_id, total_amount, now))
+            
+            loyalty_points = quote.loyalty_points
             cursor.execute(
-                "UPDATE Discounts SET useLimit = useLimit - 1 WHERE discountID = %s",
-                (applied_discount['discountID'],)
+                "UPDATE Users SET loyaltyPoints = loyaltyPoints + %s WHERE userID = %s",
+                (loyalty_points, user_id)
             )
-        
-        cursor.execute("DELETE FROM Cart WHERE userID = %s", (session['user_id'],))
-        session.pop('applied_discount', None)
-        
-        conn.commit()
-        
-        discount_msg = f" (Saved ৳{discount_amount:.2f} with discount!)" if discount_amount > 0 else ""
-        flash(f'Order placed successfully! Total amount: ৳{total_amount:.2f}{discount_msg} You earned {loyalty_points} loyalty points.', 'success')
-        return redirect(url_for('order_history'))
-        
-    except Exception as e:
-        conn.rollback()
-        flash(f'Error placing order: {str(e)}', 'error')
-        return redirect(url_for('view_cart'))
-    finally:
-        cursor.close()
-        conn.close()
+            
+            apply_order_to_sales_rollups(cursor, order_id)
+            increment_counter('total_orders', cursor=cursor)
+            
+            cursor.execute("DELETE FROM Cart WHERE userID = %s", (user_id,))
+            session.pop('applied_discount', None)
+            
+            conn.commit()
+            catalog.mark_inventory(*[item['inventoryID'] for item in cart_items])
+            if applied_discount:
+                catalog.mark_discounts()
+            session['loyalty_points'] = session.get('loyalty_points', 0) + loyalty_points
+            
+            discount_msg = f" (Saved ৳{discount_amount:.2f} with discount!)" if discount_amount > 0 else ""
+            flash(f'Order placed successfully! Total amount: ৳{total_amount:.2f}{discount_msg} You earned {loyalty_points} loyalty points.', 'success')
+            return redirect(url_for('order_history'))
+            
+        except mysql.connector.Error as e:
+            conn.rollback()
+            if e.errno == MYSQL_DEADLOCK and attempt < PLACE_ORDER_ATTEMPTS:
+                continue   # MySQL already rolled the transaction back; run it again from the start
+            if e.errno == MYSQL_DEADLOCK:
+                flash('Other orders for the same products were being placed at the same time. '
+                      'Please try again.', 'error')
+            else:
+                flash(f'Error placing order: {str(e)}', 'error')
+            return redirect(url_for('view_cart'))
+        except Exception as e:
+            conn.rollback()
+            flash(f'Error placing order: {str(e)}', 'error')
+            return redirect(url_for('view_cart'))
+        finally:
+            cursor.close()
 
 @app.route('/customer/orders')
 @login_required('customer')
 def order_history():
-    orders = execute_query("""
+    conditions, params, filters = order_list_filters()
+    orders = execute_query(f"""
         SELECT o.*, p.amount, p.paymentMethod, p.paymentStatus
-        FROM Orders o
+        FROM (
+            SELECT * FROM Orders o
+            WHERE o.userID = %s{conditions}
+            ORDER BY o.orderDate DESC, o.orderID DESC
+            LIMIT %s
+        ) o
         LEFT JOIN Payments p ON o.orderID = p.orderID
-        WHERE o.userID = %s
-        ORDER BY o.orderDate DESC
-    """, (session['user_id'],), fetch=True)
+        ORDER BY o.orderDate DESC, o.orderID DESC
+    """, (session['user_id'], *params, PAGE_SIZE + 1), fetch=True)
+    orders, next_cursor = keyset_page(orders, PAGE_SIZE, order_cursor_key)
     
-    return render_template('customer/order_history.html', orders=orders)
+    return render_template('customer/order_history.html', orders=orders, filters=filters, next_cursor=next_cursor)
 
 @app.route('/customer/order/<int:order_id>')
 @login_required('customer')
@@ -577,28 +2207,17 @@ def customer_profile():
 @app.route('/customer/wishlist')
 @login_required('customer')
 def wishlist():
-    wishlist_items = execute_query("""
-        SELECT w.productID, w.dateAdded,
-               p.productName, p.productCategory, p.brand,
-               i.inventoryID, i.pricePerUnit, i.currentStock, 
-               u.name as seller_name
-        FROM Wishlist w
-        JOIN Products p ON w.productID = p.productID
-        JOIN Inventory i ON p.productID = i.productID
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE w.userID = %s AND i.currentStock > 0 AND u.status = 'active'
-        AND i.inventoryID = (
-            SELECT i2.inventoryID 
-            FROM Inventory i2 
-            JOIN Users u2 ON i2.sellerID = u2.userID
-            WHERE i2.productID = p.productID 
-            AND i2.currentStock > 0 
-            AND u2.status = 'active'
-            ORDER BY i2.pricePerUnit ASC, i2.currentStock DESC 
-            LIMIT 1
-        )
-        ORDER BY w.dateAdded DESC
-    """, (session['user_id'],), fetch=True)
+    rows = execute_query(
+        "SELECT productID, dateAdded FROM Wishlist WHERE userID = %s ORDER BY dateAdded DESC",
+        (session['user_id'],), fetch=True
+    )
+    # Products without a live offer are hidden, as before
+    snap = catalog.snapshot()
+    wishlist_items = []
+    for row in rows:
+        offer = snap.best_offer(row['productID'])
+        if offer:
+            wishlist_items.append({**offer, 'dateAdded': row['dateAdded']})
     
     return render_template('customer/wishlist.html', wishlist_items=wishlist_items)
 
@@ -609,9 +2228,16 @@ def move_to_cart():
     product_id = request.form.get('product_id')
     quantity = int(request.form.get('quantity', 1))
     
-    if not inventory_id:
+    # Re-resolve the offer if the one shown on the wishlist page sold out or changed
+    snap = catalog.snapshot()
+    offer = snap.offer(int(inventory_id)) if inventory_id and inventory_id.isdigit() else None
+    if (offer is None or offer['currentStock'] <= 0) and product_id and product_id.isdigit():
+        offer = snap.best_offer(int(product_id))
+    
+    if not offer:
         flash('Invalid item selected', 'error')
         return redirect(url_for('wishlist'))
+    inventory_id = offer['inventoryID']
     
     try:
         # Add to cart
@@ -698,11 +2324,33 @@ def add_review():
     product_id = request.form['product_id']
     rating = int(request.form['rating'])
     review = request.form['review']
+    if rating not in RATING_STARS:
+        flash('Invalid rating', 'error')
+        return redirect(url_for('product_detail', product_id=product_id))
+    # Whole seconds, as stored in the DATETIME column, so lastReview matches the review row
+    feedback_date = datetime.now().replace(microsecond=0)
     
-    execute_query("""
-        INSERT INTO ProductReview (userID, productID, rating, review, feedbackDate)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (session['user_id'], product_id, rating, review, datetime.now()))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        cursor.execute("""
+            INSERT INTO ProductReview (userID, productID, rating, review, feedbackDate)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (session['user_id'], product_id, rating, review, feedback_date))
+        add_rating(cursor, product_id, rating, feedback_date)
+        conn.commit()
+    except mysql.connector.IntegrityError:
+        conn.rollback()
+        flash('Error adding review', 'error')
+        return redirect(url_for('product_detail', product_id=product_id))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
     
     flash('Review added successfully', 'success')
     return redirect(url_for('product_detail', product_id=product_id))
@@ -710,15 +2358,37 @@ def add_review():
 @app.route('/seller/dashboard')
 @login_required('seller')
 def seller_dashboard():
-    products = execute_query("""
+    seller_id = session['user_id']
+    # The product list is required, so it is read on the request's own connection. The other five
+    # reads are optional and run at once, each with a fallback if it fails or the pool is busy
+    products = get_seller_products(seller_id)
+    data = fan_out({
+        'orders': (get_seller_recent_orders, seller_id),
+        'monthly_stats': (get_seller_monthly_stats, seller_id),
+        'best_month': (get_seller_best_month, seller_id),
+        'best_product': (get_seller_best_product, seller_id),
+        'monthly_comparison': (get_seller_monthly_comparison, seller_id)
+    }, defaults={'orders': [], 'monthly_stats': None, 'best_month': None, 'best_product': None,
+                 'monthly_comparison': {}})
+    simple_analytics = {key: data[key] for key in ('best_month', 'best_product', 'monthly_comparison')}
+    
+    return render_template('seller/dashboard.html', 
+                         products=products, 
+                         orders=data['orders'],
+                         monthly_stats=data['monthly_stats'],
+                         simple_analytics=simple_analytics)
+
+def get_seller_products(seller_id):
+    return execute_query("""
         SELECT p.*, i.pricePerUnit, i.currentStock, i.reorderLevel, i.inventoryID
         FROM Products p
         JOIN Inventory i ON p.productID = i.productID
         WHERE i.sellerID = %s
         ORDER BY p.dateAdded DESC
-    """, (session['user_id'],), fetch=True)
-    
-    orders = execute_query("""
+    """, (seller_id,), fetch=True)
+
+def get_seller_recent_orders(seller_id, limit=10):
+    return execute_query("""
         SELECT o.orderID, o.orderDate, o.orderStatus, u.name as customer_name,
                SUM(oi.quantity * oi.priceOnSale) as amount
         FROM Orders o
@@ -727,17 +2397,8 @@ def seller_dashboard():
         JOIN Users u ON o.userID = u.userID
         WHERE i.sellerID = %s
         GROUP BY o.orderID, o.orderDate, o.orderStatus, u.name
-        ORDER BY o.orderDate DESC LIMIT 10
-    """, (session['user_id'],), fetch=True)
-    
-    monthly_stats = get_seller_monthly_stats(session['user_id'])
-    simple_analytics = get_seller_simple_analytics(session['user_id'])
-    
-    return render_template('seller/dashboard.html', 
-                         products=products, 
-                         orders=orders,
-                         monthly_stats=monthly_stats,
-                         simple_analytics=simple_analytics)
+        ORDER BY o.orderDate DESC LIMIT %s
+    """, (seller_id, limit), fetch=True)
 
 @app.route('/seller/add_product', methods=['GET', 'POST'])
 @login_required('seller')
@@ -764,11 +2425,13 @@ def add_product():
             
             # Insert inventory
             cursor.execute("""
-                INSERT INTO Inventory (productID, userID, pricePerUnit, currentStock, reorderLevel)
+                INSERT INTO Inventory (productID, sellerID, pricePerUnit, currentStock, reorderLevel)
                 VALUES (%s, %s, %s, %s, %s)
             """, (product_id, session['user_id'], float(price), stock, reorder_level))
+            increment_counter('total_products', cursor=cursor)
             
             conn.commit()
+            catalog.mark_product(product_id)
             flash('Product added successfully', 'success')
             return redirect(url_for('seller_dashboard'))
             
@@ -777,7 +2440,6 @@ def add_product():
             flash('Error adding product', 'error')
         finally:
             cursor.close()
-            conn.close()
     
     return render_template('seller/add_product.html')
 
@@ -791,8 +2453,9 @@ def edit_product(inventory_id):
         
         execute_query("""
             UPDATE Inventory SET pricePerUnit = %s, currentStock = %s, reorderLevel = %s
-            WHERE inventoryID = %s AND userID = %s
+            WHERE inventoryID = %s AND sellerID = %s
         """, (float(price), stock, reorder_level, inventory_id, session['user_id']))
+        catalog.mark_inventory(inventory_id)
         
         flash('Product updated successfully', 'success')
         return redirect(url_for('seller_dashboard'))
@@ -813,19 +2476,45 @@ def edit_product(inventory_id):
 @app.route('/seller/orders')
 @login_required('seller')
 def seller_orders():
-    orders = execute_query("""
+    conditions, params, filters = order_list_filters()
+    # Pick one page of the seller's orders first, then total only those orders' lines
+    orders = execute_query(f"""
         SELECT o.orderID, o.orderDate, o.orderStatus, u.name as customer_name, u.address,
                SUM(oi.quantity * oi.priceOnSale) as amount
-        FROM Orders o
+        FROM (
+            SELECT o.orderID, o.userID, o.orderDate, o.orderStatus FROM Orders o
+            WHERE EXISTS (
+                SELECT 1 FROM OrderItems oi
+                JOIN Inventory i ON oi.inventoryID = i.inventoryID
+                WHERE oi.orderID = o.orderID AND i.sellerID = %s
+            ){conditions}
+            ORDER BY o.orderDate DESC, o.orderID DESC
+            LIMIT %s
+        ) o
         JOIN OrderItems oi ON o.orderID = oi.orderID
         JOIN Inventory i ON oi.inventoryID = i.inventoryID
         JOIN Users u ON o.userID = u.userID
         WHERE i.sellerID = %s
         GROUP BY o.orderID, o.orderDate, o.orderStatus, u.name, u.address
-        ORDER BY o.orderDate DESC
-    """, (session['user_id'],), fetch=True)
+        ORDER BY o.orderDate DESC, o.orderID DESC
+    """, (session['user_id'], *params, PAGE_SIZE + 1, session['user_id']), fetch=True)
+    orders, next_cursor = keyset_page(orders, PAGE_SIZE, order_cursor_key)
+    
+    status_counts = cached_summary(('seller_order_status', session['user_id']),
+                                   lambda: get_seller_status_counts(session['user_id']))
     
-    return render_template('seller/orders.html', orders=orders)
+    return render_template('seller/orders.html', orders=orders, filters=filters, next_cursor=next_cursor,
+                           status_counts=status_counts)
+
+def get_seller_status_counts(seller_id):
+    return {row['orderStatus']: row['count'] for row in execute_query("""
+        SELECT o.orderStatus, COUNT(DISTINCT o.orderID) as count
+        FROM Orders o
+        JOIN OrderItems oi ON o.orderID = oi.orderID
+        JOIN Inventory i ON oi.inventoryID = i.inventoryID
+        WHERE i.sellerID = %s
+        GROUP BY o.orderStatus
+    """, (seller_id,), fetch=True)}
 
 @app.route('/seller/update_order_status', methods=['POST'])
 @login_required('seller')
@@ -833,10 +2522,36 @@ def update_order_status():
     order_id = request.form['order_id']
     status = request.form['status']
     
-    execute_query(
-        "UPDATE Orders SET orderStatus = %s WHERE orderID = %s",
-        (status, order_id)
-    )
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        cursor.execute("SELECT orderStatus FROM Orders WHERE orderID = %s FOR UPDATE", (order_id,))
+        order = cursor.fetchone()
+        if not order:
+            conn.rollback()
+            flash('Order not found', 'error')
+            return redirect(url_for('seller_orders'))
+        
+        cursor.execute(
+            "UPDATE Orders SET orderStatus = %s WHERE orderID = %s",
+            (status, order_id)
+        )
+        # Cancelled orders don't count towards sales
+        if order['orderStatus'] != 'cancelled' and status == 'cancelled':
+            apply_order_to_sales_rollups(cursor, order_id, -1)
+        elif order['orderStatus'] == 'cancelled' and status != 'cancelled':
+            apply_order_to_sales_rollups(cursor, order_id, 1)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        flash(f'Error updating order status: {str(e)}', 'error')
+        return redirect(url_for('seller_orders'))
+    finally:
+        cursor.close()
+    discard_summary(('seller_order_status', session['user_id']))
     
     flash('Order status updated', 'success')
     return redirect(url_for('seller_orders'))
@@ -877,143 +2592,324 @@ def seller_order_detail(order_id):
     
     return render_template('seller/order_detail.html', order=order[0], order_items=order_items)
 
-def get_seller_monthly_stats(seller_id):
-    current_month_start = datetime(2025, 8, 1)
-    next_month = datetime(2025, 9, 1)
-    
-    stats = execute_query("""
-        SELECT 
-            COUNT(DISTINCT o.orderID) as orders_count,
-            COALESCE(SUM(oi.quantity * oi.priceOnSale), 0) as total_revenue,
-            COALESCE(SUM(oi.quantity), 0) as items_sold,
-            CASE 
-                WHEN COUNT(DISTINCT o.orderID) > 0 
-                THEN COALESCE(SUM(oi.quantity * oi.priceOnSale), 0) / COUNT(DISTINCT o.orderID)
-                ELSE 0 
-            END as avg_order_value
+# Seller sales rollups
+def apply_order_to_sales_rollups(cursor, order_id, sign=1):
+    """Add (sign=1) or subtract (sign=-1) one order's lines in the daily seller sales rollups"""
+    cursor.execute("""
+        INSERT INTO SellerProductDailySales (sellerID, productID, salesDate, itemsSold, revenue)
+        SELECT i.sellerID, i.productID, DATE(o.orderDate), %s * SUM(oi.quantity), %s * SUM(oi.quantity * oi.priceOnSale)
         FROM Orders o
         JOIN OrderItems oi ON o.orderID = oi.orderID
         JOIN Inventory i ON oi.inventoryID = i.inventoryID
-        WHERE i.sellerID = %s 
-        AND o.orderDate >= %s 
-        AND o.orderDate < %s
-        AND o.orderStatus != 'cancelled'
-    """, (seller_id, current_month_start, next_month), fetch=True)
-    
-    return stats[0] if stats else {
-        'orders_count': 0,
-        'total_revenue': 0,
-        'items_sold': 0,
-        'avg_order_value': 0
-    }
+        WHERE o.orderID = %s
+        GROUP BY i.sellerID, i.productID, DATE(o.orderDate)
+        ON DUPLICATE KEY UPDATE itemsSold = itemsSold + VALUES(itemsSold), revenue = revenue + VALUES(revenue)
+    """, (sign, sign, order_id))
+    cursor.execute("""
+        INSERT INTO SellerDailySales (sellerID, salesDate, orderCount, itemsSold, revenue)
+        SELECT i.sellerID, DATE(o.orderDate), %s, %s * SUM(oi.quantity), %s * SUM(oi.quantity * oi.priceOnSale)
+        FROM Orders o
+        JOIN OrderItems oi ON o.orderID = oi.orderID
+        JOIN Inventory i ON oi.inventoryID = i.inventoryID
+        WHERE o.orderID = %s
+        GROUP BY i.sellerID, DATE(o.orderDate)
+        ON DUPLICATE KEY UPDATE orderCount = orderCount + VALUES(orderCount),
+                                itemsSold = itemsSold + VALUES(itemsSold), revenue = revenue + VALUES(revenue)
+    """, (sign, sign, sign, order_id))
 
-def get_seller_simple_analytics(seller_id):
-    best_month = execute_query("""
-        SELECT 
-            MONTHNAME(o.orderDate) as month_name,
-            YEAR(o.orderDate) as year,
-            COUNT(DISTINCT o.orderID) as order_count,
-            SUM(oi.quantity * oi.priceOnSale) as revenue
+def rebuild_sales_rollups(cursor):
+    """Recompute both rollup tables from every non-cancelled order"""
+    cursor.execute("DELETE FROM SellerProductDailySales")
+    cursor.execute("DELETE FROM SellerDailySales")
+    cursor.execute("""
+        INSERT INTO SellerProductDailySales (sellerID, productID, salesDate, itemsSold, revenue)
+        SELECT i.sellerID, i.productID, DATE(o.orderDate), SUM(oi.quantity), SUM(oi.quantity * oi.priceOnSale)
         FROM Orders o
         JOIN OrderItems oi ON o.orderID = oi.orderID
         JOIN Inventory i ON oi.inventoryID = i.inventoryID
-        WHERE i.sellerID = %s 
-        AND o.orderStatus != 'cancelled'
-        GROUP BY YEAR(o.orderDate), MONTH(o.orderDate), MONTHNAME(o.orderDate)
+        WHERE o.orderStatus != 'cancelled'
+        GROUP BY i.sellerID, i.productID, DATE(o.orderDate)
+    """)
+    cursor.execute("""
+        INSERT INTO SellerDailySales (sellerID, salesDate, orderCount, itemsSold, revenue)
+        SELECT i.sellerID, DATE(o.orderDate), COUNT(DISTINCT o.orderID), SUM(oi.quantity), SUM(oi.quantity * oi.priceOnSale)
+        FROM Orders o
+        JOIN OrderItems oi ON o.orderID = oi.orderID
+        JOIN Inventory i ON oi.inventoryID = i.inventoryID
+        WHERE o.orderStatus != 'cancelled'
+        GROUP BY i.sellerID, DATE(o.orderDate)
+    """)
+
+def month_window(today, months_back=0):
+    """[first day, first day of next month) for the month `months_back` before today's"""
+    year, month = today.year, today.month - months_back
+    while month <= 0:
+        month += 12
+        year -= 1
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def get_seller_sales(seller_id, start, end):
+    """Seller totals for salesDate in [start, end), read from the daily rollup"""
+    stats = execute_query("""
+        SELECT COALESCE(SUM(orderCount), 0) as orders_count,
+               COALESCE(SUM(revenue), 0) as total_revenue,
+               COALESCE(SUM(itemsSold), 0) as items_sold
+        FROM SellerDailySales
+        WHERE sellerID = %s AND salesDate >= %s AND salesDate < %s
+    """, (seller_id, start, end), fetch=True)[0]
+    # SUM() of an INT column comes back as Decimal
+    stats['orders_count'] = int(stats['orders_count'])
+    stats['items_sold'] = int(stats['items_sold'])
+    stats['avg_order_value'] = stats['total_revenue'] / stats['orders_count'] if stats['orders_count'] > 0 else 0
+    return stats
+
+def get_seller_monthly_stats(seller_id):
+    return get_seller_sales(seller_id, *month_window(date.today()))
+
+def get_seller_best_month(seller_id):
+    best_month = execute_query("""
+        SELECT 
+            MONTHNAME(salesDate) as month_name,
+            YEAR(salesDate) as year,
+            SUM(orderCount) as order_count,
+            SUM(revenue) as revenue
+        FROM SellerDailySales
+        WHERE sellerID = %s
+        GROUP BY YEAR(salesDate), MONTH(salesDate), MONTHNAME(salesDate)
         HAVING revenue > 0
         ORDER BY revenue DESC
         LIMIT 1
     """, (seller_id,), fetch=True)
-    
+    if not best_month:
+        return None
+    best_month[0]['order_count'] = int(best_month[0]['order_count'])
+    best_month[0]['month'] = f"{best_month[0]['month_name']} {best_month[0]['year']}"
+    return best_month[0]
+
+def get_seller_best_product(seller_id):
     best_product = execute_query("""
         SELECT 
             p.productName,
             p.brand,
-            SUM(oi.quantity) as total_sold,
-            SUM(oi.quantity * oi.priceOnSale) as total_revenue
-        FROM OrderItems oi
-        JOIN Inventory i ON oi.inventoryID = i.inventoryID
-        JOIN Products p ON i.productID = p.productID
-        JOIN Orders o ON oi.orderID = o.orderID
-        WHERE i.sellerID = %s 
-        AND o.orderStatus != 'cancelled'
-        GROUP BY p.productID, p.productName, p.brand
-        HAVING total_sold > 0
-        ORDER BY total_sold DESC
-        LIMIT 1
+            s.total_sold,
+            s.total_revenue
+        FROM (
+            SELECT productID, SUM(itemsSold) as total_sold, SUM(revenue) as total_revenue
+            FROM SellerProductDailySales
+            WHERE sellerID = %s
+            GROUP BY productID
+            HAVING total_sold > 0
+            ORDER BY total_sold DESC
+            LIMIT 1
+        ) s
+        JOIN Products p ON s.productID = p.productID
     """, (seller_id,), fetch=True)
+    return best_product[0] if best_product else None
+
+def get_seller_monthly_comparison(seller_id):
+    current_start, current_end = month_window(date.today())
+    previous_start, _ = month_window(date.today(), 1)
     monthly_comparison = execute_query("""
         SELECT 
-            -- August 2025 data (current month in your data)
-            SUM(CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 8
-                     THEN oi.quantity * oi.priceOnSale ELSE 0 END) as current_revenue,
-            COUNT(DISTINCT CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 8
-                     THEN o.orderID ELSE NULL END) as current_orders,
-            SUM(CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 8
-                     THEN oi.quantity ELSE 0 END) as current_items,
-                     
-            -- July 2025 data (previous month in your data)
-            SUM(CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 7
-                     THEN oi.quantity * oi.priceOnSale ELSE 0 END) as previous_revenue,
-            COUNT(DISTINCT CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 7
-                     THEN o.orderID ELSE NULL END) as previous_orders,
-            SUM(CASE WHEN YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 7
-                     THEN oi.quantity ELSE 0 END) as previous_items
-        FROM Orders o
-        JOIN OrderItems oi ON o.orderID = oi.orderID
-        JOIN Inventory i ON oi.inventoryID = i.inventoryID
-        WHERE i.sellerID = %s 
-        AND o.orderStatus != 'cancelled'
-        AND (
-            (YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 7) OR
-            (YEAR(o.orderDate) = 2025 AND MONTH(o.orderDate) = 8)
-        )
-    """, (seller_id,), fetch=True)
+            COALESCE(SUM(CASE WHEN salesDate >= %s THEN revenue ELSE 0 END), 0) as current_revenue,
+            COALESCE(SUM(CASE WHEN salesDate >= %s THEN orderCount ELSE 0 END), 0) as current_orders,
+            COALESCE(SUM(CASE WHEN salesDate >= %s THEN itemsSold ELSE 0 END), 0) as current_items,
+            COALESCE(SUM(CASE WHEN salesDate < %s THEN revenue ELSE 0 END), 0) as previous_revenue,
+            COALESCE(SUM(CASE WHEN salesDate < %s THEN orderCount ELSE 0 END), 0) as previous_orders,
+            COALESCE(SUM(CASE WHEN salesDate < %s THEN itemsSold ELSE 0 END), 0) as previous_items
+        FROM SellerDailySales
+        WHERE sellerID = %s AND salesDate >= %s AND salesDate < %s
+    """, (current_start, current_start, current_start, current_start, current_start, current_start,
+          seller_id, previous_start, current_end), fetch=True)
     
     comparison_data = monthly_comparison[0] if monthly_comparison else {
         'current_revenue': 0, 'current_orders': 0, 'current_items': 0,
         'previous_revenue': 0, 'previous_orders': 0, 'previous_items': 0
     }
+    for key in ('current_orders', 'current_items', 'previous_orders', 'previous_items'):
+        comparison_data[key] = int(comparison_data[key])
     
     current_avg = float(comparison_data['current_revenue']) / comparison_data['current_orders'] if comparison_data['current_orders'] > 0 else 0
     previous_avg = float(comparison_data['previous_revenue']) / comparison_data['previous_orders'] if comparison_data['previous_orders'] > 0 else 0
     
     comparison_data['current_avg'] = current_avg
     comparison_data['previous_avg'] = previous_avg
-    
-    if best_month:
-        best_month[0]['month'] = f"{best_month[0]['month_name']} {best_month[0]['year']}"
-    
-    return {
-        'best_month': best_month[0] if best_month else None,
-        'best_product': best_product[0] if best_product else None,
-        'monthly_comparison': comparison_data
-    }
+    return comparison_data
+
+def get_seller_simple_analytics(seller_id):
+    return fan_out({
+        'best_month': (get_seller_best_month, seller_id),
+        'best_product': (get_seller_best_product, seller_id),
+        'monthly_comparison': (get_seller_monthly_comparison, seller_id)
+    }, defaults={'best_month': None, 'best_product': None, 'monthly_comparison': {}})
+
+# Shop counters
+COUNTER_SLOTS = 8                   # rows per counter, so concurrent increments rarely collide
+COUNTER_RECONCILE_INTERVAL = 3600   # seconds between exact recounts
+COUNTER_RECONCILE_JOB = 'counter_reconcile'   # JobState row whose updatedAt is the last recount
+COUNTER_QUERIES = {
+    'total_users': "SELECT COUNT(*) as count FROM Users WHERE role != 'admin'",
+    'total_orders': "SELECT COUNT(*) as count FROM Orders",
+    'total_products': "SELECT COUNT(*) as count FROM Products"
+}
+_COUNTER_INCREMENT = """
+    INSERT INTO ShopCounters (counterName, slot, counterValue) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE counterValue = counterValue + VALUES(counterValue)
+"""
+
+def increment_counter(name, amount=1, cursor=None):
+    """Add to a counter, inside the caller's transaction when a cursor is given"""
+    params = (name, secrets.randbelow(COUNTER_SLOTS), amount)
+    if cursor is not None:
+        cursor.execute(_COUNTER_INCREMENT, params)
+    else:
+        execute_query(_COUNTER_INCREMENT, params)
+
+def reconcile_counters(min_interval=0):
+    """Replace every counter with an exact count, unless that was done in the last min_interval seconds"""
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        # Lock the counter rows first so increments committed meanwhile are included in the counts
+        cursor.execute("SELECT counterName FROM ShopCounters FOR UPDATE")
+        cursor.fetchall()
+        # Other workers may have recounted while we waited for the lock
+        cursor.execute("SELECT updatedAt FROM JobState WHERE jobName = %s FOR UPDATE", (COUNTER_RECONCILE_JOB,))
+        row = cursor.fetchone()
+        if row and datetime.now() - row['updatedAt'] < timedelta(seconds=min_interval):
+            conn.rollback()
+            return
+        counts = {}
+        for name, query in COUNTER_QUERIES.items():
+            cursor.execute(query)
+            counts[name] = cursor.fetchone()['count']
+        cursor.execute("DELETE FROM ShopCounters")
+        cursor.executemany(
+            "INSERT INTO ShopCounters (counterName, slot, counterValue) VALUES (%s, 0, %s)",
+            list(counts.items())
+        )
+        set_job_watermark(cursor, COUNTER_RECONCILE_JOB, 0)   # only updatedAt is used
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+_counter_reconcile_running = threading.Lock()
+
+def _reconcile_counters_job():
+    try:
+        _run_task('counter_reconcile', reconcile_counters, (COUNTER_RECONCILE_INTERVAL,))
+    except Exception as e:
+        print(f"Error reconciling counters: {e}")
+    finally:
+        _counter_reconcile_running.release()
+
+def schedule_counter_reconcile():
+    """Recount on a background thread if the last recount is older than COUNTER_RECONCILE_INTERVAL.
+
+    Counters that were never recounted only hold the increments since they were created, so
+    the first recount runs before returning.
+    """
+    rows = execute_query("SELECT updatedAt FROM JobState WHERE jobName = %s", (COUNTER_RECONCILE_JOB,), fetch=True)
+    if not rows:
+        reconcile_counters(COUNTER_RECONCILE_INTERVAL)
+        return
+    if datetime.now() - rows[0]['updatedAt'] < timedelta(seconds=COUNTER_RECONCILE_INTERVAL):
+        return
+    if _counter_reconcile_running.acquire(blocking=False):
+        threading.Thread(target=_reconcile_counters_job, name='counter-reconcile', daemon=True).start()
+
+def read_counters():
+    """All dashboard counters in one round trip"""
+    rows = execute_query("""
+        SELECT counterName, SUM(counterValue) as value FROM ShopCounters GROUP BY counterName
+        UNION ALL
+        SELECT 'active_discounts', COUNT(*) FROM Discounts WHERE endDate >= %s
+    """, (datetime.now(),), fetch=True)
+    return {row['counterName']: int(row['value']) for row in rows}
 
 # Admin Routes
 @app.route('/admin/dashboard')
 @login_required('admin')
 def admin_dashboard():
     # Get statistics
-    stats = {
-        'total_users': execute_query("SELECT COUNT(*) as count FROM Users WHERE role != 'admin'", fetch=True)[0]['count'],
-        'total_orders': execute_query("SELECT COUNT(*) as count FROM Orders", fetch=True)[0]['count'],
-        'total_products': execute_query("SELECT COUNT(*) as count FROM Products", fetch=True)[0]['count'],
-        'active_discounts': execute_query("SELECT COUNT(*) as count FROM Discounts WHERE endDate >= %s", (datetime.now(),), fetch=True)[0]['count']
-    }
+    schedule_counter_reconcile()
+    stats = read_counters()
     
     return render_template('admin/dashboard.html', stats=stats)
 
+@app.route('/admin/stats/db_pool')
+@login_required('admin')
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/admin/stats/activity_buffer')
+@login_required('admin')
+def activity_buffer_stats():
+    return jsonify(activity_buffer.stats())
+
+@app.route('/admin/slow_queries')
+@login_required('admin')
+def admin_slow_queries():
+    queries = slow_query_summary()[:50]
+    return render_template('admin/slow_queries.html', queries=queries, threshold=SLOW_QUERY_THRESHOLD,
+                           log_file=SLOW_QUERY_LOG)
+
+@app.route('/admin/stats/fragment_cache')
+@login_required('admin')
+def fragment_cache_stats():
+    return jsonify(fragment_cache.stats())
+
+@app.route('/admin/stats/password_hasher')
+@login_required('admin')
+def password_hasher_stats():
+    return jsonify(password_hasher.stats())
+
 @app.route('/admin/users')
 @login_required('admin')
 def admin_users():
-    users = execute_query("""
+    filters = {key: request.args[key] for key in ('role', 'status') if request.args.get(key)}
+    conditions, params = '', []
+    for column in ('role', 'status'):
+        if filters.get(column):
+            conditions += f" AND {column} = %s"
+            params.append(filters[column])
+    after = decode_cursor(request.args.get('after', ''), date, int)
+    if after:
+        conditions += " AND (joinDate < %s OR (joinDate = %s AND userID < %s))"
+        params.extend([after[0], after[0], after[1]])
+    
+    users = execute_query(f"""
         SELECT userID, name, email, phone, role, joinDate, loyaltyPoints, status
-        FROM Users WHERE role != 'admin'
-        ORDER BY joinDate DESC
-    """, fetch=True)
+        FROM Users WHERE role != 'admin'{conditions}
+        ORDER BY joinDate DESC, userID DESC
+        LIMIT %s
+    """, (*params, PAGE_SIZE + 1), fetch=True)
+    users, next_cursor = keyset_page(users, PAGE_SIZE, lambda user: (user['joinDate'], user['userID']))
+    
+    user_counts = cached_summary(('user_counts',), get_user_counts)
     
-    return render_template('admin/users.html', users=users)
+    return render_template('admin/users.html', users=users, filters=filters, next_cursor=next_cursor,
+                           user_counts=user_counts)
+
+def get_user_counts():
+    user_counts = {'customer': 0, 'seller': 0, 'banned': 0}
+    for row in execute_query("""
+        SELECT role, status, COUNT(*) as count FROM Users
+        WHERE role != 'admin'
+        GROUP BY role, status
+    """, fetch=True):
+        user_counts[row['role']] = user_counts.get(row['role'], 0) + row['count']
+        if row['status'] == 'banned':
+            user_counts['banned'] += row['count']
+    return user_counts
 
 @app.route('/admin/update_payment_status', methods=['POST'])
 @login_required('admin')
@@ -1049,45 +2945,141 @@ def update_payment_status():
     flash('Payment status updated successfully', 'success')
     return redirect(url_for('admin_orders'))
 
+PAYMENT_SYNC_CHUNK = 5000          # orderIDs covered by each statement
+PAYMENT_SYNC_TIME_BUDGET = 20      # seconds per run; the rest is picked up by the next run
+PAYMENT_SYNC_COMPLETE_SHARE = 0.5  # part of the budget completing payments may use before creating missing ones
+PAYMENT_SYNC_JOB = 'payment_sync'
+PAYMENT_COMPLETE_JOB = 'payment_complete'   # position of the current pass over pending payments
+
+def get_job_watermark(cursor, job_name):
+    cursor.execute("SELECT lastID FROM JobState WHERE jobName = %s FOR UPDATE", (job_name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def set_job_watermark(cursor, job_name, last_id):
+    cursor.execute("""
+        INSERT INTO JobState (jobName, lastID, updatedAt) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE lastID = VALUES(lastID), updatedAt = VALUES(updatedAt)
+    """, (job_name, last_id, datetime.now()))
+
+def reconcile_payments(conn, chunk_size=PAYMENT_SYNC_CHUNK, time_budget=PAYMENT_SYNC_TIME_BUDGET, rescan=False):
+    """Complete delivered payments and create missing ones, one orderID range per transaction.
+
+    Both phases keep their position in JobState, so a run that stops early is continued by the
+    next one. Completing payments gets a share of the time budget and then a fresh pass once it
+    reaches the end; missing payments are only looked for above the high-water mark, so repeated
+    runs cost nothing once caught up. rescan starts both again from the first order.
+    Returns (completed, created, finished).
+    """
+    started = time.monotonic()
+    deadline = started + time_budget
+    cursor = conn.cursor()
+    completed = created = 0
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+
+        cursor.execute("SELECT MIN(orderID), MAX(orderID) FROM Payments WHERE paymentStatus = 'pending'")
+        first, last = cursor.fetchone()
+        conn.commit()
+        complete_deadline = started + time_budget * PAYMENT_SYNC_COMPLETE_SHARE
+        passed = first is None
+        restart = rescan
+        while not passed:
+            conn.start_transaction()
+            position = 0 if restart else get_job_watermark(cursor, PAYMENT_COMPLETE_JOB)
+            restart = False
+            position = max(position, first - 1)
+            if position >= last:
+                set_job_watermark(cursor, PAYMENT_COMPLETE_JOB, 0)   # the next run starts a new pass
+                conn.commit()
+                passed = True
+                break
+            if time.monotonic() > complete_deadline:
+                conn.commit()
+                break
+            upper = min(position + chunk_size, last)
+            cursor.execute("""
+                UPDATE Payments p
+                JOIN Orders o ON p.orderID = o.orderID
+                SET p.paymentStatus = 'completed'
+                WHERE p.orderID > %s AND p.orderID <= %s AND o.orderStatus = 'delivered' AND p.paymentStatus = 'pending'
+            """, (position, upper))
+            completed += cursor.rowcount
+            set_job_watermark(cursor, PAYMENT_COMPLETE_JOB, upper)
+            conn.commit()
+
+        cursor.execute("SELECT MAX(orderID) FROM Orders")
+        last_order = cursor.fetchone()[0] or 0
+        conn.commit()
+        while True:
+            conn.start_transaction()
+            watermark = 0 if rescan else get_job_watermark(cursor, PAYMENT_SYNC_JOB)
+            rescan = False
+            if watermark >= last_order:
+                conn.commit()
+                return completed, created, passed
+            if time.monotonic() > deadline:
+                conn.commit()
+                return completed, created, False
+            upper = min(watermark + chunk_size, last_order)
+            cursor.execute("""
+                INSERT INTO Payments (orderID, amount, paymentMethod, paymentStatus, transactionDate)
+                SELECT o.orderID, ROUND(COALESCE(SUM(oi.quantity * oi.priceOnSale), 0) + %s, 2), 'cash_on_delivery',
+                       CASE o.orderStatus WHEN 'delivered' THEN 'completed' WHEN 'cancelled' THEN 'failed' ELSE 'pending' END,
+                       %s
+                FROM Orders o
+                JOIN OrderItems oi ON o.orderID = oi.orderID
+                LEFT JOIN Payments p ON o.orderID = p.orderID
+                WHERE o.orderID > %s AND o.orderID <= %s AND p.orderID IS NULL
+                GROUP BY o.orderID, o.orderStatus
+            """, (DELIVERY_CHARGE, datetime.now(), watermark, upper))
+            created += cursor.rowcount
+            set_job_watermark(cursor, PAYMENT_SYNC_JOB, upper)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
 @app.route('/admin/sync_payment_status', methods=['POST'])
 @login_required('admin')
 def sync_payment_status():
     """Auto-sync payment status based on business logic"""
-    delivered_updates = execute_query("""
-        UPDATE Payments p
-        JOIN Orders o ON p.orderID = o.orderID
-        SET p.paymentStatus = 'completed'
-        WHERE o.orderStatus = 'delivered' AND p.paymentStatus = 'pending'
-    """)
-    orders_without_payments = execute_query("""
-        SELECT o.orderID, o.orderStatus, COALESCE(SUM(oi.quantity * oi.priceOnSale), 0) as subtotal
-        FROM Orders o
-        JOIN OrderItems oi ON o.orderID = oi.orderID
-        LEFT JOIN Payments p ON o.orderID = p.orderID
-        WHERE p.orderID IS NULL
-        GROUP BY o.orderID, o.orderStatus
-    """, fetch=True)
-    
-    created_records = 0
-    for order in orders_without_payments:
-        if order['orderStatus'] == 'delivered':
-            payment_status = 'completed'
-        elif order['orderStatus'] == 'cancelled':
-            payment_status = 'failed'
-        else:
-            payment_status = 'pending'
-        total_amount = currency_round(Decimal(str(order['subtotal'])) + DELIVERY_CHARGE)
-        
-        execute_query("""
-            INSERT INTO Payments (orderID, amount, paymentMethod, paymentStatus, transactionDate)
-            VALUES (%s, %s, 'cash_on_delivery', %s, %s)
-        """, (order['orderID'], float(total_amount), payment_status, datetime.now()))
-        
-        created_records += 1
-    
-    flash(f'Payment status synchronized successfully. Created {created_records} missing payment records.', 'success')
+    try:
+        completed, created, finished = reconcile_payments(get_db_connection(), rescan=bool(request.form.get('rescan')))
+    except Exception as e:
+        flash(f'Error synchronizing payments: {str(e)}', 'error')
+        return redirect(url_for('admin_orders'))
+    
+    message = (f'Payment status synchronized successfully. Completed {completed} delivered payments, '
+               f'created {created} missing payment records.')
+    if not finished:
+        message += ' More orders remain, run the sync again to continue.'
+    flash(message, 'success')
     return redirect(url_for('admin_orders'))
 
+@app.route('/admin/rebuild_sales_rollups', methods=['POST'])
+@login_required('admin')
+def rebuild_sales_rollups_route():
+    """Backfill the seller sales rollups, e.g. after importing orders"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        rebuild_sales_rollups(cursor)
+        conn.commit()
+        flash('Seller sales rollups rebuilt successfully', 'success')
+    except Exception as e:
+        conn.rollback()
+        flash(f'Error rebuilding sales rollups: {str(e)}', 'error')
+    finally:
+        cursor.close()
+    return redirect(url_for('admin_dashboard'))
+
 @app.route('/admin/toggle_user_status', methods=['POST'])
 @login_required('admin')
 def toggle_user_status():
@@ -1100,6 +3092,8 @@ def toggle_user_status():
         "UPDATE Users SET status = %s WHERE userID = %s AND role != 'admin'",
         (new_status, user_id)
     )
+    catalog.mark_seller(user_id)
+    discard_summary(('user_counts',))
     
     flash(f'User {action}ned successfully', 'success')
     return redirect(url_for('admin_users'))
@@ -1107,29 +3101,39 @@ def toggle_user_status():
 @app.route('/admin/orders')
 @login_required('admin')
 def admin_orders():
-    orders = execute_query("""
+    conditions, params, filters = order_list_filters()
+    # Page through Orders first so the Users/Payments joins only touch one page of rows
+    orders = execute_query(f"""
         SELECT o.orderID, o.userID, o.orderDate, o.orderStatus, 
                u.name as customer_name, 
                p.amount, p.paymentStatus
-        FROM Orders o
+        FROM (
+            SELECT orderID, userID, orderDate, orderStatus FROM Orders o
+            WHERE 1 = 1{conditions}
+            ORDER BY o.orderDate DESC, o.orderID DESC
+            LIMIT %s
+        ) o
         JOIN Users u ON o.userID = u.userID
         LEFT JOIN Payments p ON o.orderID = p.orderID
-        ORDER BY o.orderDate DESC
-    """, fetch=True)
+        ORDER BY o.orderDate DESC, o.orderID DESC
+    """, (*params, PAGE_SIZE + 1), fetch=True)
+    orders, next_cursor = keyset_page(orders, PAGE_SIZE, order_cursor_key)
     
-    return render_template('admin/orders.html', orders=orders)
+    return render_template('admin/orders.html', orders=orders, filters=filters, next_cursor=next_cursor)
 
 @app.route('/admin/discounts')
 @login_required('admin')
 def admin_discounts():
     discounts = execute_query("""
-        SELECT *, 
-               COALESCE(useLimit, 0) as useLimit
-        FROM Discounts 
-        ORDER BY startDate DESC
+        SELECT d.*, 
+               COALESCE(d.useLimit, 0) as useLimit,
+               IF(COUNT(s.slot) = 0, COALESCE(d.useLimit, 0), SUM(s.remaining)) as remainingUses
+        FROM Discounts d
+        LEFT JOIN DiscountUseSlots s ON s.discountID = d.discountID
+        GROUP BY d.discountID
+        ORDER BY d.startDate DESC
     """, fetch=True)
     
-    from datetime import date
     today = date.today()
     
     return render_template('admin/discounts.html', discounts=discounts, today=today)
@@ -1137,125 +3141,392 @@ def admin_discounts():
 @app.route('/admin/add_discount', methods=['POST'])
 @login_required('admin')
 def add_discount():
-    discount_code = request.form['discount_code']
+    discount_code = normalize_discount_code(request.form['discount_code'])
     discount_type = request.form['discount_type']
     discount_value = currency_round(Decimal(request.form['discount_value']))
     start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d')
     end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d')
     use_limit = int(request.form.get('use_limit', 0))
     
-    execute_query("""
-        INSERT INTO Discounts (discountCode, discountType, discountValue, startDate, endDate, useLimit)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (discount_code, discount_type, float(discount_value), start_date, end_date, use_limit))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.start_transaction()
+        cursor.execute("""
+            INSERT INTO Discounts (discountCode, discountType, discountValue, startDate, endDate, useLimit)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (discount_code, discount_type, float(discount_value), start_date, end_date, use_limit))
+        allocate_discount_slots(cursor, cursor.lastrowid, use_limit)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        flash(f'Error adding discount: {str(e)}', 'error')
+        return redirect(url_for('admin_discounts'))
+    finally:
+        cursor.close()
+    catalog.mark_discounts()
     
     flash('Discount added successfully', 'success')
     return redirect(url_for('admin_discounts'))
 
 # Search functionality
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_FIELD_WEIGHTS = {'productName': 3.0, 'brand': 2.0, 'productCategory': 1.0}
+SEARCH_MAX_EXPANSIONS = 50   # prefix/typo variants considered per query token
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.casefold())
+
+def _deletion_variants(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+class SearchIndex:
+    """Inverted index over product name, brand and category.
+
+    Scores with BM25 using per-field weights; query tokens also match as
+    prefixes and, from 4 characters up, within one edit.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, products):
+        self.postings = {}   # term -> {productID: weighted term frequency}
+        self.doc_len = {}
+        for pid, product in products.items():
+            length = 0.0
+            for field, weight in SEARCH_FIELD_WEIGHTS.items():
+                for term in tokenize(product[field]):
+                    docs = self.postings.setdefault(term, {})
+                    docs[pid] = docs.get(pid, 0.0) + weight
+                    length += weight
+            self.doc_len[pid] = length
+        self.avg_len = (sum(self.doc_len.values()) / len(self.doc_len)) if self.doc_len else 1.0
+        self.terms = sorted(self.postings)
+        # Deletion variants give edit-distance-1 lookups without scanning the vocabulary
+        self.deletes = {}
+        for term in self.terms:
+            if len(term) >= 4:
+                for variant in _deletion_variants(term):
+                    self.deletes.setdefault(variant, set()).add(term)
+        total = len(self.doc_len)
+        self.idf = {term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for term, docs in self.postings.items()}
+
+    def _expand(self, token):
+        """Index terms matching a query token, with a weight for how loosely they match"""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        pos = bisect.bisect_left(self.terms, token)
+        while pos < len(self.terms) and len(matches) < SEARCH_MAX_EXPANSIONS and self.terms[pos].startswith(token):
+            matches.setdefault(self.terms[pos], 0.7)
+            pos += 1
+        if len(token) >= 4:
+            candidates = set(self.deletes.get(token, ()))
+            for variant in _deletion_variants(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self.deletes.get(variant, ()))
+            for term in sorted(candidates)[:SEARCH_MAX_EXPANSIONS]:
+                matches.setdefault(term, 0.5)
+        return matches
+
+    def search(self, query):
+        """Return [(productID, score)] best first; every query token has to match"""
+        scores = None
+        for token in set(tokenize(query)):
+            token_scores = {}
+            for term, factor in self._expand(token).items():
+                idf = self.idf[term]
+                for pid, tf in self.postings[term].items():
+                    norm = tf + self.K1 * (1 - self.B + self.B * self.doc_len[pid] / self.avg_len)
+                    score = factor * idf * tf * (self.K1 + 1) / norm
+                    if score > token_scores.get(pid, 0.0):
+                        token_scores[pid] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+        return sorted((scores or {}).items(), key=lambda item: -item[1])
+
+_search_index = None             # (products_version, SearchIndex)
+_search_index_lock = threading.Lock()
+_search_index_building = False
+
+def _rebuild_search_index(snap):
+    global _search_index, _search_index_building
+    try:
+        index = SearchIndex(snap.products)
+        with _search_index_lock:
+            if _search_index[0] < snap.products_version:
+                _search_index = (snap.products_version, index)
+    except Exception as e:
+        print(f"Error rebuilding search index: {e}")
+    finally:
+        with _search_index_lock:
+            _search_index_building = False
+
+def get_search_index(snap):
+    """Search index for the snapshot's products.
+
+    Only the first call builds it inline. After that a products change starts one rebuild
+    on a background thread, and searches use the previous index until it is swapped in.
+    """
+    global _search_index, _search_index_building
+    index = _search_index
+    if index is not None and index[0] >= snap.products_version:
+        return index[1]
+    with _search_index_lock:
+        index = _search_index
+        if index is None:
+            index = _search_index = (snap.products_version, SearchIndex(snap.products))
+        elif index[0] < snap.products_version and not _search_index_building:
+            _search_index_building = True
+            threading.Thread(target=_rebuild_search_index, args=(snap,), name='search-index', daemon=True).start()
+    return index[1]
+
 @app.route('/search')
 @login_required('customer')
 def search():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
     category = request.args.get('category', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
     
-    search_query = """
-        SELECT p.*, i.pricePerUnit, i.currentStock, u.name as seller_name
-        FROM Products p 
-        JOIN Inventory i ON p.productID = i.productID 
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE i.currentStock > 0 AND u.status = 'active'
-    """
-    params = []
-    
+    snap = catalog.snapshot()
     if query:
-        search_query += " AND (p.productName LIKE %s OR p.brand LIKE %s)"
-        params.extend([f'%{query}%', f'%{query}%'])
+        offers = []
+        for product_id, score in get_search_index(snap).search(query):
+            offers.extend(offer for offer in snap.product_offers(product_id) if offer['currentStock'] > 0)
+    else:
+        offers = list(snap.live_offers())
     
     if category:
-        search_query += " AND p.productCategory = %s"
-        params.append(category)
+        # Case-insensitive like the column collation
+        category_key = category.casefold()
+        offers = [offer for offer in offers if offer['productCategory'].casefold() == category_key]
     
-    search_query += " ORDER BY p.dateAdded DESC"
+    total = len(offers)
+    pages = max((total + limit - 1) // limit, 1)
+    products = offers[(page - 1) * limit:page * limit]
     
-    products = execute_query(search_query, params, fetch=True)
-    
-    return render_template('customer/search_results.html', products=products, query=query, category=category)
+    return render_template('customer/search_results.html', products=products, query=query, category=category,
+                           total=total, page=page, pages=pages, limit=limit)
+
+# User activity tracking
+ACTIVITY_BUFFER_SIZE = 10000    # events held in memory before new ones are dropped
+ACTIVITY_FLUSH_BATCH = 500      # flush as soon as this many events are queued
+ACTIVITY_FLUSH_INTERVAL = 2.0   # seconds between time-triggered flushes
+
+class ActivityBuffer:
+    """Buffers UserActivity rows in memory and writes them in batches from a background thread"""
+
+    def __init__(self, max_size=ACTIVITY_BUFFER_SIZE, batch_size=ACTIVITY_FLUSH_BATCH, flush_interval=ACTIVITY_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'dropped': 0, 'flushed': 0, 'batches': 0, 'flush_errors': 0}
+
+    def add(self, user_id, inventory_id, activity_type):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((user_id, inventory_id, activity_type, datetime.now()))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats['queued'] = self._queue.qsize()
+        stats['capacity'] = self._queue.maxsize
+        return stats
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write(self, batch):
+        try:
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # IGNORE so a duplicate primary key doesn't throw away the whole batch
+                    cursor.executemany("""
+                        INSERT IGNORE INTO UserActivity (userID, inventoryID, activityType, activityDate)
+                        VALUES (%s, %s, %s, %s)
+                    """, batch)
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self._count('flush_errors')
+            self._count('dropped', len(batch))
+            print(f"Error flushing user activity: {e}")
+            return 0
+        self._count('batches')
+        self._count('flushed', len(batch))
+        return len(batch)
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+activity_buffer = ActivityBuffer()
+atexit.register(activity_buffer.shutdown)
 
 def track_user_activity(user_id, inventory_id, activity_type):
-    try:
-        execute_query("""
-            INSERT INTO UserActivity (userID, inventoryID, activityType, activityDate)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, inventory_id, activity_type, datetime.now()))
-    except Exception as e:
-        pass
+    activity_buffer.add(user_id, inventory_id, activity_type)
+
+# Recommendations
+RECOMMENDATION_RELOAD_INTERVAL = 600   # seconds between reloads of the popular items
+RECOMMENDATION_POPULAR_LIMIT = 200     # popular items kept in memory as fallback candidates
+ACTIVITY_WEIGHTS = {'purchase': 3.0, 'wishlist': 2.0, 'view': 1.0}
+RECENT_ACTIVITY_LIMIT = 50             # most recent items used as seeds for a user
+
+class RecommendationModel:
+    """Top-K item neighbours and item popularity built offline by recommendations.py.
+
+    Only the most popular items are kept in memory; neighbours are read per request
+    for the user's seed items, by primary key.
+    """
+
+    def __init__(self, reload_interval=RECOMMENDATION_RELOAD_INTERVAL, popular_limit=RECOMMENDATION_POPULAR_LIMIT):
+        self.reload_interval = reload_interval
+        self.popular_limit = popular_limit
+        self.popular = []     # inventoryIDs, most active first
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+                return
+            self.popular = [row['inventoryID'] for row in execute_query(
+                "SELECT inventoryID FROM ItemPopularity ORDER BY score DESC LIMIT %s", (self.popular_limit,), fetch=True
+            )]
+            self._loaded_at = time.monotonic()
+
+    def neighbors(self, inventory_ids):
+        """inventoryID -> [(neighborID, score)] for the given items"""
+        if not inventory_ids:
+            return {}
+        ids = list(inventory_ids)
+        neighbors = {}
+        for row in execute_query(
+            f"SELECT inventoryID, neighborID, score FROM ItemNeighbors WHERE inventoryID IN ({_in_clause(ids)})",
+            ids, fetch=True
+        ):
+            neighbors.setdefault(row['inventoryID'], []).append((row['neighborID'], row['score']))
+        return neighbors
+
+recommendation_model = RecommendationModel()
 
 def get_recommended_products(user_id, limit=4):
     """Get personalized product recommendations based on user activity"""
-    
-    # Strategy 1: Products from categories the user has interacted with
-    category_based = execute_query("""
-        SELECT DISTINCT p.*, i.pricePerUnit, i.currentStock, i.inventoryID, u.name as seller_name
-        FROM Products p 
-        JOIN Inventory i ON p.productID = i.productID 
-        JOIN Users u ON i.sellerID = u.userID
-        WHERE i.currentStock > 0 AND u.status = 'active'
-        AND p.productCategory IN (
-            SELECT DISTINCT p2.productCategory
-            FROM UserActivity ua
-            JOIN Inventory i2 ON ua.inventoryID = i2.inventoryID
-            JOIN Products p2 ON i2.productID = p2.productID
-            WHERE ua.userID = %s
-        )
-        AND i.inventoryID NOT IN (
-            SELECT inventoryID FROM UserActivity 
-            WHERE userID = %s AND activityType = 'purchase'
-        )
-        ORDER BY RAND()
-        LIMIT %s
-    """, (user_id, user_id, limit), fetch=True)
-    
-    if len(category_based) >= limit:
-        return category_based[:limit]
-    
-    # Strategy 2: Popular products
-    popular_products = execute_query("""
-        SELECT p.*, i.pricePerUnit, i.currentStock, i.inventoryID, u.name as seller_name,
-               COUNT(ua.inventoryID) as activity_count
-        FROM Products p 
-        JOIN Inventory i ON p.productID = i.productID 
-        JOIN Users u ON i.sellerID = u.userID
-        LEFT JOIN UserActivity ua ON i.inventoryID = ua.inventoryID
-        WHERE i.currentStock > 0 AND u.status = 'active'
-        AND i.inventoryID NOT IN (
-            SELECT inventoryID FROM UserActivity 
-            WHERE userID = %s AND activityType = 'purchase'
-        )
-        GROUP BY i.inventoryID
-        ORDER BY activity_count DESC, p.dateAdded DESC
-        LIMIT %s
-    """, (user_id, limit - len(category_based)), fetch=True)
-    
-    all_recommendations = category_based + popular_products
-    
+    recommendation_model.ensure_loaded()
+    snap = catalog.snapshot()
+    
+    activity = execute_query("""
+        SELECT inventoryID, activityType, MAX(activityDate) as lastDate
+        FROM UserActivity
+        WHERE userID = %s
+        GROUP BY inventoryID, activityType
+        ORDER BY lastDate DESC
+    """, (user_id,), fetch=True)
+    purchased = {row['inventoryID'] for row in activity if row['activityType'] == 'purchase'}
+    
+    # Strategy 1: Neighbours of the items the user interacted with most recently
+    seeds = activity[:RECENT_ACTIVITY_LIMIT]
+    neighbors = recommendation_model.neighbors({row['inventoryID'] for row in seeds})
+    scores = {}
+    for row in seeds:
+        weight = ACTIVITY_WEIGHTS.get(row['activityType'], 1.0)
+        for neighbor_id, score in neighbors.get(row['inventoryID'], ()):
+            scores[neighbor_id] = scores.get(neighbor_id, 0.0) + weight * score
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    
+    # Strategy 2: Popular products, then the newest ones
+    candidates = ranked + recommendation_model.popular
+    
+    recommendations = []
     seen = set()
-    unique_recommendations = []
-    for product in all_recommendations:
-        if product['inventoryID'] not in seen:
-            seen.add(product['inventoryID'])
-            unique_recommendations.append(product)
-            if len(unique_recommendations) >= limit:
+    for inventory_id in candidates:
+        offer = snap.offer(inventory_id)
+        if (offer is None or offer['currentStock'] <= 0
+                or inventory_id in purchased or inventory_id in seen):
+            continue
+        seen.add(inventory_id)
+        recommendations.append(offer)
+        if len(recommendations) >= limit:
+            return recommendations
+    
+    for offer in snap.live_offers():
+        if offer['inventoryID'] not in purchased and offer['inventoryID'] not in seen:
+            recommendations.append(offer)
+            if len(recommendations) >= limit:
                 break
     
-    return unique_recommendations
+    return recommendations
 
 @app.route('/api/user_points')
 @login_required('customer')
 def get_user_points():
     user = execute_query("SELECT loyaltyPoints FROM Users WHERE userID = %s", (session['user_id'],), fetch=True)
     if user:
-        session['loyalty_points'] = user[0]['loyaltyPoints']
+        cache_loyalty_points(user[0]['loyaltyPoints'])
         return jsonify({'points': user[0]['loyaltyPoints']})
     return jsonify({'points': 0})
 
@@ -1265,5 +3536,77 @@ def analytics_popup():
     analytics = get_seller_simple_analytics(session['user_id'])
     return render_template('seller/analytics_popup.html', analytics=analytics)
 
+# Startup warm-up
+# With SHOPEASE_WARM_UP=1 each worker compiles every template and fills its connection pool and
+# in-process caches while it boots, before it takes requests. The startup log times each phase.
+# Nothing runs at import: create_app() is the per-worker hook, so importing the module (the reloader's
+# parent, a preloading master, scripts) opens no connections and starts no threads.
+WARM_UP = os.environ.get('SHOPEASE_WARM_UP') == '1'
+STARTUP_SECONDS = Gauge('shopease_startup_seconds', 'Worker start-up time by phase', ['phase'],
+                        multiprocess_mode='max')
+
+startup_logger = logging.getLogger('shopease.startup')
+startup_logger.setLevel(logging.INFO)
+if not startup_logger.handlers:
+    _startup_handler = logging.StreamHandler()
+    _startup_handler.setFormatter(logging.Formatter('%(asctime)s %(name)s [%(process)d] %(message)s'))
+    startup_logger.addHandler(_startup_handler)
+startup_logger.propagate = False
+
+def precompile_templates():
+    """Load every template, which compiles it or reads it from the bytecode cache"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+def warm_up():
+    """Run each warm-up phase, logging failures instead of stopping the worker; returns the timings"""
+    phases = [
+        ('templates', precompile_templates),
+        ('db_pool', lambda: db_pool.prefill(DB_POOL_CONFIG['pool_size'])),
+        ('catalog', lambda: len(catalog.snapshot().live)),
+        ('search_index', lambda: len(get_search_index(catalog.snapshot()).terms)),
+        ('recommendations', recommendation_model.ensure_loaded)
+    ]
+    timings = []
+    with app.app_context():
+        for name, run in phases:
+            start = time.perf_counter()
+            try:
+                result = run()
+                status = f" ({result})" if result is not None else ''
+            except Exception as e:
+                status = f" (failed: {e})"
+            elapsed = time.perf_counter() - start
+            STARTUP_SECONDS.labels(name).set(elapsed)
+            timings.append(f"{name} {elapsed:.3f}s{status}")
+    return timings
+
+def log_startup():
+    imported = time.perf_counter() - STARTUP_BEGAN
+    timings = warm_up() if WARM_UP else []
+    total = time.perf_counter() - STARTUP_BEGAN
+    STARTUP_SECONDS.labels('import').set(imported)
+    STARTUP_SECONDS.labels('total').set(total)
+    startup_logger.info(f"ready in {total:.3f}s: import {imported:.3f}s"
+                        + ''.join(f", {timing}" for timing in timings)
+                        + ('' if WARM_UP else ' (warm-up off, set SHOPEASE_WARM_UP=1)'))
+
+_started_pid = None
+_started_lock = threading.Lock()
+
+def create_app():
+    """Per-worker entry point: warms up and logs start-up once in the process that serves, then returns the app"""
+    global _started_pid
+    with _started_lock:
+        if _started_pid != os.getpid():
+            _started_pid = os.getpid()
+            log_startup()
+    return app
+
 if __name__ == '__main__':
+    # With debug on, this process only runs the reloader; the child it starts (WERKZEUG_RUN_MAIN) serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
     app.run(debug=True)
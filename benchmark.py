@@ -0,0 +1,589 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+from werkzeug.security import generate_password_hash
+
+import recommendations
+
+# Database configuration; the benchmark database is dropped and recreated on every run
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'enter_your_password',
+    'database': 'shopease_bench'
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(HERE, 'sql_schema.sql')
+APP_FILE = os.path.join(HERE, '__main__.py')
+
+# Row counts at --scale 1
+BASE_COUNTS = {
+    'sellers': 50,
+    'customers': 2000,
+    'products': 5000,
+    'orders': 10000,
+    'activity': 100000,
+    'wishlist': 5000,
+    'reviews': 5000,
+    'discounts': 20
+}
+INSERT_BATCH = 5000
+REDEMPTION_USES = 5000
+REDEMPTION_HOLD_MS = 5        # rest of the place_order transaction, held after redeeming
+ORDER_HISTORY_DAYS = 180
+REGRESSION_THRESHOLD = 0.20   # allowed p95 slowdown before --compare fails
+
+CATEGORIES = ['Electronics', 'Fashion', 'Books', 'Home Decor', 'Sports', 'Beauty', 'Groceries', 'Toys',
+              'Kitchen', 'Stationery']
+ADJECTIVES = ['Classic', 'Premium', 'Smart', 'Compact', 'Wireless', 'Organic', 'Deluxe', 'Portable', 'Cotton',
+              'Leather', 'Steel', 'Wooden', 'Mini', 'Pro', 'Ultra', 'Eco']
+NOUNS = ['Phone', 'Shirt', 'Novel', 'Lamp', 'Football', 'Serum', 'Rice', 'Puzzle', 'Blender', 'Notebook',
+         'Headphones', 'Saree', 'Cookbook', 'Vase', 'Racket', 'Perfume', 'Tea', 'Robot', 'Kettle', 'Pen']
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [10, 10, 10, 15, 50, 5]
+ACTIVITY_TYPES = ['view', 'wishlist', 'purchase']
+ACTIVITY_TYPE_WEIGHTS = [80, 10, 10]
+
+STATUS_VARIABLES = ('Questions', 'Innodb_rows_read')
+
+# Local server
+
+def start_local_server(mysqld):
+    """Initialise and start a throwaway mysqld in a temp dir, listening on a unix socket only"""
+    workdir = tempfile.mkdtemp(prefix='shopease-bench-')
+    datadir = os.path.join(workdir, 'data')
+    socket = os.path.join(workdir, 'mysql.sock')
+    subprocess.run([mysqld, '--no-defaults', f'--datadir={datadir}', '--initialize-insecure'],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    log = open(os.path.join(workdir, 'mysqld.log'), 'w')
+    proc = subprocess.Popen([mysqld, '--no-defaults', f'--datadir={datadir}', f'--socket={socket}',
+                             '--skip-networking', '--mysqlx=OFF', f'--pid-file={workdir}/mysqld.pid'],
+                            stdout=log, stderr=log)
+    config = {'unix_socket': socket, 'user': 'root', 'password': '', 'database': DB_CONFIG['database']}
+
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            mysql.connector.connect(**{k: v for k, v in config.items() if k != 'database'}).close()
+            break
+        except mysql.connector.Error:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                stop_local_server(proc, workdir)
+                raise RuntimeError(f"mysqld did not start, see {workdir}/mysqld.log")
+            time.sleep(0.5)
+    return proc, workdir, config
+
+def stop_local_server(proc, workdir):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+# Schema and data
+
+def schema_statements(path=SCHEMA_FILE):
+    """Statements from sql_schema.sql, minus the CREATE DATABASE / USE lines"""
+    with open(path) as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    statements = []
+    for statement in ''.join(lines).split(';'):
+        statement = statement.strip()
+        if not statement or statement.upper().startswith(('CREATE DATABASE', 'USE ')):
+            continue
+        statements.append(statement)
+    return statements
+
+def create_database(config):
+    server = {k: v for k, v in config.items() if k != 'database'}
+    conn = mysql.connector.connect(**server)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{config['database']}`")
+    cursor.execute(f"CREATE DATABASE `{config['database']}`")
+    cursor.execute(f"USE `{config['database']}`")
+    for statement in schema_statements():
+        cursor.execute(statement)
+    cursor.close()
+    conn.close()
+
+def insert_rows(cursor, sql, rows):
+    for start in range(0, len(rows), INSERT_BATCH):
+        cursor.executemany(sql, rows[start:start + INSERT_BATCH])
+
+def skewed(rng, items):
+    """Pick from items with a long tail, so a few products get most of the traffic"""
+    return items[int(len(items) * rng.random() ** 3)]
+
+def generate_data(conn, scale, seed=42):
+    """Fill the benchmark database with synthetic shop data; returns the generated ids"""
+    rng = random.Random(seed)
+    counts = {name: max(1, int(count * scale)) for name, count in BASE_COUNTS.items()}
+    today = date.today()
+    now = datetime.now()
+    password = generate_password_hash('demo123')
+    cursor = conn.cursor()
+
+    # Admin is userID 1, then sellers, then customers
+    users = [('Admin Account', 'admin@bench.shopease', '01700000000', password, 'admin', '2025-01-01')]
+    users += [(f'Seller {n}', f'seller{n}@bench.shopease', f'018{n:08d}', password, 'seller',
+               today - timedelta(days=rng.randint(200, 700))) for n in range(counts['sellers'])]
+    users += [(f'Customer {n}', f'customer{n}@bench.shopease', f'019{n:08d}', password, 'customer',
+               today - timedelta(days=rng.randint(0, 700))) for n in range(counts['customers'])]
+    insert_rows(cursor, """
+        INSERT INTO Users (name, email, phone, password, role, status, address, joinDate)
+        VALUES (%s, %s, %s, %s, %s, 'active', 'Dhaka', %s)
+    """, users)
+    seller_ids = list(range(2, 2 + counts['sellers']))
+    customer_ids = list(range(2 + counts['sellers'], 2 + counts['sellers'] + counts['customers']))
+
+    brands = [f'Brand{n}' for n in range(max(10, counts['products'] // 100))]
+    insert_rows(cursor, """
+        INSERT INTO Products (productName, productCategory, brand, dateAdded) VALUES (%s, %s, %s, %s)
+    """, [(f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {n}', rng.choice(CATEGORIES), rng.choice(brands),
+           today - timedelta(days=rng.randint(0, 365))) for n in range(counts['products'])])
+    product_ids = list(range(1, counts['products'] + 1))
+
+    inventory, prices = [], {}
+    for pid in product_ids:
+        for sid in rng.sample(seller_ids, min(len(seller_ids), rng.randint(1, 3))):
+            price = round(rng.uniform(50, 5000), 2)
+            stock = 0 if rng.random() < 0.1 else rng.randint(1, 200)
+            inventory.append((pid, sid, price, stock))
+            prices[len(inventory)] = price
+    insert_rows(cursor, """
+        INSERT INTO Inventory (productID, sellerID, pricePerUnit, currentStock) VALUES (%s, %s, %s, %s)
+    """, inventory)
+    inventory_ids = list(prices)
+
+    orders, items, payments = [], [], []
+    for order_id in range(1, counts['orders'] + 1):
+        order_date = now - timedelta(days=rng.randint(0, ORDER_HISTORY_DAYS), seconds=rng.randint(0, 86399))
+        status = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+        orders.append((rng.choice(customer_ids), order_date, status))
+        total = 0
+        for iid in {skewed(rng, inventory_ids) for _ in range(rng.randint(1, 4))}:
+            quantity = rng.randint(1, 3)
+            items.append((order_id, iid, quantity, prices[iid]))
+            total += quantity * prices[iid]
+        payments.append((order_id, order_date, round(total + 60, 2),
+                         'completed' if status == 'delivered' else 'pending'))
+    insert_rows(cursor, "INSERT INTO Orders (userID, orderDate, orderStatus) VALUES (%s, %s, %s)", orders)
+    insert_rows(cursor, "INSERT INTO OrderItems (orderID, inventoryID, quantity, priceOnSale) VALUES (%s, %s, %s, %s)",
+                items)
+    insert_rows(cursor, "INSERT INTO Payments (orderID, transactionDate, amount, paymentStatus) VALUES (%s, %s, %s, %s)",
+                payments)
+
+    insert_rows(cursor, "INSERT IGNORE INTO UserActivity (userID, inventoryID, activityType, activityDate) VALUES (%s, %s, %s, %s)",
+                [(rng.choice(customer_ids), skewed(rng, inventory_ids), rng.choices(ACTIVITY_TYPES, ACTIVITY_TYPE_WEIGHTS)[0],
+                  now - timedelta(seconds=rng.randint(0, ORDER_HISTORY_DAYS * 86400))) for _ in range(counts['activity'])])
+    insert_rows(cursor, "INSERT IGNORE INTO Wishlist (userID, productID, dateAdded) VALUES (%s, %s, %s)",
+                [(rng.choice(customer_ids), skewed(rng, product_ids), now - timedelta(days=rng.randint(0, 90)))
+                 for _ in range(counts['wishlist'])])
+    insert_rows(cursor, "INSERT IGNORE INTO ProductReview (userID, productID, feedbackDate, rating, review) VALUES (%s, %s, %s, %s, %s)",
+                [(rng.choice(customer_ids), skewed(rng, product_ids), now - timedelta(days=rng.randint(0, 365)),
+                  rng.randint(1, 5), 'Benchmark review') for _ in range(counts['reviews'])])
+    insert_rows(cursor, """
+        INSERT INTO Discounts (discountCode, discountType, discountValue, startDate, endDate, useLimit)
+        VALUES (%s, 'percentage', %s, %s, %s, %s)
+    """, [(f'BENCH{n}', rng.randint(5, 20), today - timedelta(days=30), today + timedelta(days=rng.randint(-10, 60)),
+           rng.choice([None, 1000])) for n in range(counts['discounts'])])
+
+    conn.commit()
+    cursor.close()
+    return {'sellers': seller_ids, 'customers': customer_ids, 'products': product_ids, 'inventory': inventory_ids}
+
+def load_app(config):
+    """Import __main__.py as a module and point its connection pool at the benchmark database"""
+    spec = importlib.util.spec_from_file_location('shopease_app', APP_FILE)
+    shop = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(shop)
+    shop.DB_CONFIG = config
+    shop.db_pool = shop.ConnectionPool(config, **shop.DB_POOL_CONFIG)
+    shop.app.config['TESTING'] = True
+    return shop
+
+def build_derived_tables(shop, conn):
+    """Rollups, counters, rating aggregates and the recommendation model, as an operator would after an import"""
+    with shop.app.app_context():
+        db = shop.get_db_connection()
+        cursor = db.cursor()
+        db.start_transaction()
+        shop.rebuild_sales_rollups(cursor)
+        db.commit()
+        cursor.close()
+        shop.reconcile_counters()
+        shop.rebuild_rating_stats()
+    cursor = conn.cursor()
+    cursor.execute("SELECT discountID, useLimit FROM Discounts WHERE useLimit > 0")
+    for discount_id, use_limit in cursor.fetchall():
+        shop.allocate_discount_slots(cursor, discount_id, use_limit)
+    conn.commit()
+    cursor.close()
+    neighbors, popularity = recommendations.build_item_neighbors(*recommendations.load_activity(conn))
+    recommendations.save_model(conn, neighbors, popularity)
+    cursor = conn.cursor()
+    for table in ('Users', 'Products', 'Inventory', 'Orders', 'OrderItems', 'UserActivity', 'Wishlist',
+                  'ProductReview', 'ProductRatingStats', 'SellerDailySales', 'SellerProductDailySales',
+                  'ItemNeighbors', 'ItemPopularity'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+
+# Measurement
+
+def server_status(cursor):
+    cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s)" % tuple(['%s'] * len(STATUS_VARIABLES)),
+                   STATUS_VARIABLES)
+    return {name: int(value) for name, value in cursor.fetchall()}
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    rank = max(1, min(len(samples), -(-len(samples) * pct // 100)))
+    return samples[int(rank) - 1]
+
+class Recorder:
+    """Times a block and charges it with the server-wide query and row counters it caused"""
+
+    def __init__(self, conn):
+        self.cursor = conn.cursor()
+        # The status queries themselves show up in the deltas; measure that once and subtract it
+        before = server_status(self.cursor)
+        after = server_status(self.cursor)
+        self.overhead = {name: after[name] - before[name] for name in STATUS_VARIABLES}
+        self.results = {}
+
+    def measure(self, name, prepare, settle=None):
+        fn = prepare()
+        before = server_status(self.cursor)
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if settle:
+            settle()
+        after = server_status(self.cursor)
+        result = self.results.setdefault(name, {'times': [], 'queries': 0, 'rows': 0})
+        result['times'].append(elapsed)
+        result['queries'] += after['Questions'] - before['Questions'] - self.overhead['Questions']
+        result['rows'] += after['Innodb_rows_read'] - before['Innodb_rows_read'] - self.overhead['Innodb_rows_read']
+
+    def summary(self):
+        summary = {}
+        for name, result in self.results.items():
+            times = sorted(result['times'])
+            runs = len(times)
+            summary[name] = {
+                'runs': runs,
+                'p50_ms': round(percentile(times, 50) * 1000, 3),
+                'p95_ms': round(percentile(times, 95) * 1000, 3),
+                'p99_ms': round(percentile(times, 99) * 1000, 3),
+                'queries': round(result['queries'] / runs, 2),
+                'rows_examined': round(result['rows'] / runs, 1)
+            }
+        return summary
+
+def make_client(shop, role, user_id):
+    client = shop.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = user_id
+        s['role'] = role
+        s['name'] = 'Benchmark'
+        if role == 'customer':
+            s['loyalty_points'] = 0
+    return client
+
+def fill_cart(conn, user_id, inventory_ids, rng):
+    cursor = conn.cursor()
+    cursor.execute("SELECT inventoryID FROM Inventory WHERE currentStock > 5 AND inventoryID IN (%s)"
+                   % ', '.join(['%s'] * len(inventory_ids)), inventory_ids)
+    in_stock = [row[0] for row in cursor.fetchall()]
+    cursor.executemany("INSERT IGNORE INTO Cart (userID, inventoryID, quantity) VALUES (%s, %s, 1)",
+                       [(user_id, iid) for iid in rng.sample(in_stock, min(3, len(in_stock)))])
+    conn.commit()
+    cursor.close()
+
+def route_cases(shop, ids, conn, rng):
+    """(name, prepare) pairs; prepare does the untimed setup and returns the request to time"""
+    def request(role, pick, method, path, data=None, setup=None):
+        def prepare():
+            user_id = rng.choice(pick)
+            client = make_client(shop, role, user_id)
+            if setup:
+                setup(user_id)
+            url = path() if callable(path) else path
+
+            def run():
+                response = client.open(url, method=method, data=data)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{method} {url} returned {response.status_code}")
+            return run
+        return prepare
+
+    def search_path():
+        return f"/search?q={rng.choice(ADJECTIVES + NOUNS).lower()}"
+
+    def product_path():
+        return f"/customer/product/{rng.choice(ids['products'])}"
+
+    # place_order needs a cart; filling it is not part of the timed request
+    def order_setup(user_id):
+        fill_cart(conn, user_id, rng.sample(ids['inventory'], min(20, len(ids['inventory']))), rng)
+
+    return [
+        ('route customer_home', request('customer', ids['customers'], 'GET', '/customer/home')),
+        ('route search', request('customer', ids['customers'], 'GET', search_path)),
+        ('route product_detail', request('customer', ids['customers'], 'GET', product_path)),
+        ('route wishlist', request('customer', ids['customers'], 'GET', '/customer/wishlist')),
+        ('route order_history', request('customer', ids['customers'], 'GET', '/customer/orders')),
+        ('route seller_dashboard', request('seller', ids['sellers'], 'GET', '/seller/dashboard')),
+        ('route seller_orders', request('seller', ids['sellers'], 'GET', '/seller/orders')),
+        ('route admin_dashboard', request('admin', [1], 'GET', '/admin/dashboard')),
+        ('route place_order', request('customer', ids['customers'], 'POST', '/customer/place_order',
+                                      data={'delivery_address': 'Benchmark Road'}, setup=order_setup)),
+    ]
+
+def query_cases(shop, ids, rng):
+    """The hot query functions on their own, outside any request handling"""
+    def in_context(fn):
+        def run():
+            with shop.app.test_request_context():
+                fn()
+        return lambda: run
+
+    return [
+        ('query catalog_full_load', in_context(lambda: shop.catalog._full_load())),
+        ('query recommended_products', in_context(lambda: shop.get_recommended_products(rng.choice(ids['customers'])))),
+        ('query seller_monthly_stats', in_context(lambda: shop.get_seller_monthly_stats(rng.choice(ids['sellers'])))),
+        ('query seller_simple_analytics', in_context(lambda: shop.get_seller_simple_analytics(rng.choice(ids['sellers'])))),
+        ('query admin_counters', in_context(lambda: shop.read_counters())),
+    ]
+
+def run_benchmark(shop, ids, conn, iterations, warmup, only=None, seed=42):
+    rng = random.Random(seed)
+    recorder = Recorder(conn)
+    cases = route_cases(shop, ids, conn, rng) + query_cases(shop, ids, rng)
+    if only:
+        cases = [case for case in cases if any(word in case[0] for word in only)]
+    for name, prepare in cases:
+        for _ in range(warmup):
+            prepare()()
+        shop.activity_buffer.flush()
+        for _ in range(iterations):
+            # Activity writes are deferred; flush them so they are charged to the request that caused them
+            recorder.measure(name, prepare, settle=shop.activity_buffer.flush)
+    return recorder.summary()
+
+def benchmark_redemptions(shop, config, threads, uses=REDEMPTION_USES, hold_ms=REDEMPTION_HOLD_MS):
+    """Hammer one discount code from many connections until its uses run out.
+
+    Compares the sharded DiscountUseSlots redemption with the old single-row
+    useLimit decrement, and checks that neither hands out more uses than it has.
+    """
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Discounts WHERE discountCode = 'BENCHHOT'")
+    cursor.execute("""
+        INSERT INTO Discounts (discountCode, discountType, discountValue, startDate, endDate, useLimit)
+        VALUES ('BENCHHOT', 'percentage', 10, CURDATE(), CURDATE(), %s)
+    """, (uses,))
+    discount_id = cursor.lastrowid
+    shop.allocate_discount_slots(cursor, discount_id, uses)
+    conn.commit()
+
+    def redeem_row(cur):
+        cur.execute("UPDATE Discounts SET useLimit = useLimit - 1 WHERE discountID = %s AND useLimit > 0",
+                    (discount_id,))
+        return cur.rowcount == 1
+
+    def redeem_slots(cur):
+        return shop.redeem_discount(cur, discount_id)
+
+    summary = {}
+    for name, redeem in (('redeem single_row', redeem_row), ('redeem sharded_slots', redeem_slots)):
+        times, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            worker_conn = mysql.connector.connect(**config)
+            worker_cursor = worker_conn.cursor()
+            local = []
+            try:
+                while True:
+                    start = time.perf_counter()
+                    worker_conn.start_transaction()
+                    redeemed = redeem(worker_cursor)
+                    if hold_ms:
+                        time.sleep(hold_ms / 1000)
+                    worker_conn.commit()
+                    if not redeemed:
+                        break
+                    local.append(time.perf_counter() - start)
+            except mysql.connector.Error as e:
+                errors.append(str(e))
+            finally:
+                worker_cursor.close()
+                worker_conn.close()
+                with lock:
+                    times.extend(local)
+
+        before = server_status(cursor)
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        after = server_status(cursor)
+
+        if name == 'redeem single_row':
+            cursor.execute("SELECT useLimit FROM Discounts WHERE discountID = %s", (discount_id,))
+        else:
+            cursor.execute("SELECT SUM(remaining) FROM DiscountUseSlots WHERE discountID = %s", (discount_id,))
+        left = int(cursor.fetchone()[0])
+        conn.commit()
+        if errors or len(times) != uses or left != 0:
+            raise RuntimeError(f"{name}: {len(times)} of {uses} uses redeemed, {left} left, errors: {errors[:3]}")
+
+        times.sort()
+        summary[name] = {
+            'runs': len(times),
+            'p50_ms': round(percentile(times, 50) * 1000, 3),
+            'p95_ms': round(percentile(times, 95) * 1000, 3),
+            'p99_ms': round(percentile(times, 99) * 1000, 3),
+            'queries': round((after['Questions'] - before['Questions']) / len(times), 2),
+            'rows_examined': round((after['Innodb_rows_read'] - before['Innodb_rows_read']) / len(times), 1),
+            'throughput': round(len(times) / elapsed, 1)
+        }
+        print(f"{name}: {uses} redemptions by {threads} connections in {elapsed:.2f}s "
+              f"({len(times) / elapsed:,.0f}/s), none oversubscribed")
+
+    cursor.execute("DELETE FROM Discounts WHERE discountID = %s", (discount_id,))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return summary
+
+# Reporting
+
+def print_report(summary, baseline=None):
+    header = f"{'case':34} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'rows':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in summary.items():
+        line = (f"{name:34} {stats['runs']:>5} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['p99_ms']:>9.2f} {stats['queries']:>8.1f} {stats['rows_examined']:>10.1f}")
+        if baseline and name in baseline:
+            base = baseline[name]
+            change = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+            line += f"  p95 {change:+.0%}, queries {stats['queries'] - base['queries']:+.1f}"
+        print(line)
+
+def find_regressions(summary, baseline, threshold=REGRESSION_THRESHOLD):
+    """Cases whose p95 got slower than the threshold, or that now issue more queries per run"""
+    regressions = []
+    for name, stats in summary.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['p95_ms'] and stats['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+        if stats['queries'] > base['queries'] + 0.5:
+            regressions.append(f"{name}: queries {base['queries']:.1f} -> {stats['queries']:.1f} per run")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot routes and queries against a synthetic database")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplier for the generated row counts")
+    parser.add_argument('--iterations', type=int, default=200, help="timed runs per case")
+    parser.add_argument('--warmup', type=int, default=10, help="untimed runs per case, to fill the app caches")
+    parser.add_argument('--only', nargs='+', metavar='WORD', help="only run cases whose name contains WORD")
+    parser.add_argument('--mysqld', nargs='?', const='mysqld', metavar='PATH',
+                        help="start a throwaway MySQL 8 server instead of using DB_CONFIG")
+    parser.add_argument('--reuse', action='store_true', help="keep the existing benchmark database instead of regenerating it")
+    parser.add_argument('--redemptions', type=int, metavar='THREADS',
+                        help="also benchmark concurrent redemptions of one discount code from THREADS connections")
+    parser.add_argument('--redemption-uses', type=int, default=REDEMPTION_USES, help="uses of the hot code for --redemptions")
+    parser.add_argument('--hold-ms', type=float, default=REDEMPTION_HOLD_MS,
+                        help="time each redemption transaction stays open, standing in for the rest of place_order")
+    parser.add_argument('--save', metavar='FILE', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare against a saved baseline, exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="allowed p95 slowdown for --compare")
+    args = parser.parse_args()
+
+    server = None
+    config = dict(DB_CONFIG)
+    if args.mysqld:
+        proc, workdir, config = start_local_server(shutil.which(args.mysqld) or args.mysqld)
+        server = (proc, workdir)
+
+    try:
+        start = time.perf_counter()
+        if not args.reuse or server:
+            create_database(config)
+        conn = mysql.connector.connect(**config)
+        shop = load_app(config)
+        if not args.reuse or server:
+            ids = generate_data(conn, args.scale)
+            build_derived_tables(shop, conn)
+        else:
+            cursor = conn.cursor()
+            cursor.execute("SELECT userID, role FROM Users")
+            users = cursor.fetchall()
+            cursor.execute("SELECT productID FROM Products")
+            products = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT inventoryID FROM Inventory")
+            inventory = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            ids = {'sellers': [uid for uid, role in users if role == 'seller'],
+                   'customers': [uid for uid, role in users if role == 'customer'],
+                   'products': products, 'inventory': inventory}
+        print(f"Database ready in {time.perf_counter() - start:.1f}s "
+              f"({len(ids['customers'])} customers, {len(ids['products'])} products, {len(ids['inventory'])} offers)")
+
+        summary = run_benchmark(shop, ids, conn, args.iterations, args.warmup, args.only)
+        if args.redemptions:
+            summary.update(benchmark_redemptions(shop, config, args.redemptions, args.redemption_uses, args.hold_ms))
+        shop.activity_buffer.shutdown()
+        conn.close()
+    finally:
+        if server:
+            stop_local_server(*server)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_report(summary, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'scale': args.scale,
+                       'iterations': args.iterations, 'results': summary}, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if baseline:
+        regressions = find_regressions(summary, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import urllib.parse
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = os.path.join(DIST_DIR, 'manifest.json')
+
+# Third-party files kept under static/vendor; fonts and images their CSS refers to are fetched too.
+# Keep in sync with VENDOR_CDN in __main__.py
+VENDOR_ASSETS = {
+    'vendor/bootstrap-5.3.0/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap-5.3.0/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome-6.0.0/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css'
+}
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.ttf', '.eot'}   # woff2, png etc. are compressed already
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+SOURCE_MAP = re.compile(rb'\n?/[/*]# sourceMappingURL=[^\n]*')
+
+def css_references(css):
+    """Relative url(...) targets in a stylesheet, without query strings or fragments"""
+    refs = []
+    for match in CSS_URL.finditer(css):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            continue
+        refs.append(re.split(r'[?#]', ref, maxsplit=1)[0])
+    return refs
+
+def download(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def fetch():
+    """Download the pinned vendor files into static/vendor"""
+    for name, url in VENDOR_ASSETS.items():
+        data = download(url)
+        write_file(os.path.join(STATIC_DIR, name), data)
+        print(f"{name} ({len(data):,} bytes)")
+        if name.endswith('.css'):
+            for ref in dict.fromkeys(css_references(data.decode())):
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(name), ref))
+                ref_data = download(urllib.parse.urljoin(url, ref))
+                write_file(os.path.join(STATIC_DIR, target), ref_data)
+                print(f"  {target} ({len(ref_data):,} bytes)")
+
+def source_files():
+    """Logical names (paths relative to static/, with /) of everything except the build output"""
+    names = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != DIST_DIR)
+        for filename in sorted(files):
+            if filename.startswith('.') or filename.endswith('.tmp'):
+                continue
+            names.append(os.path.relpath(os.path.join(root, filename), STATIC_DIR).replace(os.sep, '/'))
+    return names
+
+def fingerprint(name, data):
+    stem, ext = posixpath.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+def rewrite_css(name, css, manifest):
+    """Point url(...) references at the fingerprinted copies"""
+    def replace(match):
+        ref = match.group(2).strip()
+        path = re.split(r'[?#]', ref, maxsplit=1)[0]
+        suffix = ref[len(path):]
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')) or target not in manifest:
+            return match.group(0)
+        new = posixpath.relpath(manifest[target], posixpath.dirname(name))
+        return f"url({match.group(1)}{new}{suffix}{match.group(1)})"
+    return CSS_URL.sub(replace, css)
+
+def write_compressed(path, data):
+    """Pre-compressed variants served when the client accepts them; skipped when they don't help"""
+    written = []
+    variants = [('.gz', gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=BROTLI_QUALITY)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            write_file(path + suffix, compressed)
+            written.append((suffix, len(compressed)))
+    return written
+
+def build(clean=False):
+    """Copy static/ into static/dist with content-hashed names and write the manifest"""
+    if clean and os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    names = source_files()
+    manifest = {}
+    # Stylesheets last, so the files they refer to already have their fingerprinted names
+    for name in sorted(names, key=lambda name: name.endswith('.css')):
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            data = f.read()
+        ext = posixpath.splitext(name)[1]
+        if ext in ('.css', '.js'):
+            data = SOURCE_MAP.sub(b'', data)
+        if ext == '.css':
+            data = rewrite_css(name, data.decode(), manifest).encode()
+        manifest[name] = fingerprint(name, data)
+        path = os.path.join(DIST_DIR, manifest[name])
+        write_file(path, data)
+        compressed = write_compressed(path, data) if ext in COMPRESSIBLE else []
+        sizes = ', '.join(f"{suffix} {size:,}" for suffix, size in compressed)
+        print(f"{manifest[name]} ({len(data):,} bytes{', ' + sizes if sizes else ''})")
+    write_file(MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    print(f"{len(manifest)} assets, manifest written to {os.path.relpath(MANIFEST)}")
+    if brotli is None:
+        print("brotli is not installed, only gzip variants were written")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vendor and fingerprint static assets")
+    parser.add_argument('--fetch', action='store_true', help="download the pinned vendor files into static/vendor first")
+    parser.add_argument('--clean', action='store_true',
+                        help="delete static/dist before building (drops files pages rendered before the deploy may still use)")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch()
+    build(args.clean)
@@ -0,0 +1,16 @@
+import signal
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Runs inside the PasswordHasher process pool in __main__.py. Only werkzeug is imported here, so
+# worker processes never load the app, its connection pools or its metrics.
+
+def init_worker():
+    # Ctrl-C reaches the whole process group; the parent shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def hash_password(password, method):
+    return generate_password_hash(password, method)
+
+def verify_password(pwhash, password):
+    return check_password_hash(pwhash, password)
@@ -0,0 +1,151 @@
+import argparse
+import time
+
+import mysql.connector
+import numpy as np
+from scipy import sparse
+
+# Database configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'enter_your_password',
+    'database': 'enter_your_database_name'
+}
+
+# Keep in sync with ACTIVITY_WEIGHTS in __main__.py
+ACTIVITY_WEIGHTS = {'purchase': 3.0, 'wishlist': 2.0, 'view': 1.0}
+TOP_K = 20
+FETCH_SIZE = 50000
+WRITE_BATCH = 5000
+
+def build_item_neighbors(user_ids, item_ids, weights, top_k=TOP_K):
+    """Item-item cosine similarity over implicit feedback.
+
+    Takes three parallel arrays (one entry per activity row) and returns
+    (src, dst, score) arrays holding the top_k neighbours of every item,
+    plus (items, popularity) with the total activity weight per item.
+    """
+    users, user_idx = np.unique(user_ids, return_inverse=True)
+    items, item_idx = np.unique(item_ids, return_inverse=True)
+
+    # User x item matrix; repeated events add up, log1p keeps heavy viewers from dominating
+    matrix = sparse.csr_matrix((weights.astype(np.float32), (user_idx, item_idx)),
+                               shape=(len(users), len(items)))
+    matrix.sum_duplicates()
+    popularity = np.asarray(matrix.sum(axis=0)).ravel()
+    matrix.data = np.log1p(matrix.data)
+
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    norms = np.sqrt(cooccurrence.diagonal())
+    norms[norms == 0] = 1.0
+    cooccurrence = cooccurrence - sparse.diags(cooccurrence.diagonal())
+    cooccurrence.eliminate_zeros()
+    inverse = sparse.diags(1.0 / norms)
+    similarity = (inverse @ cooccurrence @ inverse).tocsr()
+
+    src, dst, score = [], [], []
+    indptr, indices, data = similarity.indptr, similarity.indices, similarity.data
+    for row in range(similarity.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        scores = data[start:end]
+        if end - start > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(end - start)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        src.append(np.full(len(top), items[row]))
+        dst.append(items[indices[start:end][top]])
+        score.append(scores[top])
+
+    if not src:
+        empty = np.array([], dtype=np.int64)
+        return (empty, empty, np.array([], dtype=np.float32)), (items, popularity)
+    return (np.concatenate(src), np.concatenate(dst), np.concatenate(score)), (items, popularity)
+
+def load_activity(conn):
+    """Stream UserActivity through an unbuffered cursor into numpy arrays"""
+    cursor = conn.cursor(buffered=False)
+    cursor.execute("SELECT userID, inventoryID, activityType FROM UserActivity")
+    user_chunks, item_chunks, weight_chunks = [], [], []
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        user_chunks.append(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+        item_chunks.append(np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)))
+        weight_chunks.append(np.fromiter((ACTIVITY_WEIGHTS.get(row[2], 1.0) for row in rows),
+                                         dtype=np.float32, count=len(rows)))
+    cursor.close()
+    if not user_chunks:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+    return np.concatenate(user_chunks), np.concatenate(item_chunks), np.concatenate(weight_chunks)
+
+def save_model(conn, neighbors, popularity):
+    """Replace ItemNeighbors and ItemPopularity in one transaction"""
+    src, dst, score = neighbors
+    items, totals = popularity
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM ItemNeighbors")
+        cursor.execute("DELETE FROM ItemPopularity")
+        for start in range(0, len(src), WRITE_BATCH):
+            cursor.executemany(
+                "INSERT INTO ItemNeighbors (inventoryID, neighborID, score) VALUES (%s, %s, %s)",
+                list(zip(src[start:start + WRITE_BATCH].tolist(), dst[start:start + WRITE_BATCH].tolist(),
+                         score[start:start + WRITE_BATCH].tolist()))
+            )
+        for start in range(0, len(items), WRITE_BATCH):
+            cursor.executemany(
+                "INSERT INTO ItemPopularity (inventoryID, score) VALUES (%s, %s)",
+                list(zip(items[start:start + WRITE_BATCH].tolist(), totals[start:start + WRITE_BATCH].tolist()))
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def rebuild(top_k=TOP_K):
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        start = time.perf_counter()
+        user_ids, item_ids, weights = load_activity(conn)
+        loaded = time.perf_counter()
+        neighbors, popularity = build_item_neighbors(user_ids, item_ids, weights, top_k)
+        built = time.perf_counter()
+        save_model(conn, neighbors, popularity)
+        saved = time.perf_counter()
+    finally:
+        conn.close()
+    print(f"{len(user_ids)} activity rows, {len(popularity[0])} items, {len(neighbors[0])} neighbour pairs")
+    print(f"load {loaded - start:.2f}s, build {built - loaded:.2f}s, save {saved - built:.2f}s")
+
+def benchmark(rows, users, items, top_k=TOP_K, seed=42):
+    """Time the model build on synthetic activity with a long-tailed item distribution"""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(0, users, rows)
+    item_ids = np.minimum(rng.zipf(1.3, rows) - 1, items - 1)
+    weights = rng.choice(np.array(list(ACTIVITY_WEIGHTS.values()), dtype=np.float32), rows, p=[0.1, 0.1, 0.8])
+
+    start = time.perf_counter()
+    neighbors, popularity = build_item_neighbors(user_ids, item_ids, weights, top_k)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} rows, {users} users, {len(popularity[0])} items -> {len(neighbors[0])} neighbour pairs "
+          f"in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the item-to-item recommendation model from UserActivity")
+    parser.add_argument('--top-k', type=int, default=TOP_K, help="neighbours kept per item")
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help="time the build on synthetic data instead")
+    parser.add_argument('--users', type=int, default=200000, help="synthetic users for --benchmark")
+    parser.add_argument('--items', type=int, default=50000, help="synthetic items for --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.users, args.items, args.top_k)
+    else:
+        rebuild(args.top_k)
@@ -343,3 +343,26 @@ INSERT INTO UserActivity (userID, inventoryID, activityType, activityDate) VALUE
 (23, 2, 'view', '2025-09-08 14:55:00'),
 (24, 3, 'view', '2025-09-08 17:10:00'),
 (25, 4, 'view', '2025-09-09 09:25:00');
+
+-- Split each discount's use limit over 16 redemption slots (DISCOUNT_SLOTS in __main__.py)
+INSERT INTO DiscountUseSlots (discountID, slot, remaining)
+WITH RECURSIVE slots (slot) AS (SELECT 0 UNION ALL SELECT slot + 1 FROM slots WHERE slot < 15)
+SELECT d.discountID, slots.slot, FLOOR(d.useLimit / 16) + (slots.slot < MOD(d.useLimit, 16))
+FROM Discounts d CROSS JOIN slots
+WHERE d.useLimit > 0;
+
+-- Rating aggregates for the sample reviews (kept up to date by add_review afterwards)
+INSERT INTO ProductRatingStats (productID, reviewCount, ratingTotal, rating1, rating2, rating3, rating4, rating5, lastReview)
+SELECT productID, COUNT(*), SUM(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5),
+       MAX(feedbackDate)
+FROM ProductReview
+GROUP BY productID;
+
+-- Dashboard counters for the sample rows (COUNTER_QUERIES in __main__.py), recorded as an exact recount
+INSERT INTO ShopCounters (counterName, slot, counterValue)
+SELECT 'total_users', 0, COUNT(*) FROM Users WHERE role != 'admin'
+UNION ALL SELECT 'total_orders', 0, COUNT(*) FROM Orders
+UNION ALL SELECT 'total_products', 0, COUNT(*) FROM Products;
+
+INSERT INTO JobState (jobName, lastID, updatedAt) VALUES ('counter_reconcile', 0, NOW());
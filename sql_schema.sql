@@ -14,7 +14,8 @@ CREATE TABLE Users (
     
     INDEX idx_email (email),
     INDEX idx_role (role),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_join_date (joinDate)
 );
 
 CREATE TABLE Products (
@@ -54,6 +55,7 @@ CREATE TABLE Orders (
     
     FOREIGN KEY (userID) REFERENCES Users(userID) ON DELETE CASCADE,
     INDEX idx_user_order (userID),
+    INDEX idx_user_order_date (userID, orderDate),
     INDEX idx_order_date (orderDate),
     INDEX idx_order_status (orderStatus)
 );
@@ -69,7 +71,8 @@ CREATE TABLE Discounts (
     
     CHECK (endDate >= startDate),
     INDEX idx_discount_code (discountCode),
-    INDEX idx_discount_dates (startDate, endDate)
+    INDEX idx_discount_dates (startDate, endDate),
+    INDEX idx_discount_end (endDate)
 );
 
 CREATE TABLE OrderItems (
@@ -129,7 +132,7 @@ CREATE TABLE ProductReview (
     FOREIGN KEY (userID) REFERENCES Users(userID) ON DELETE CASCADE,
     FOREIGN KEY (productID) REFERENCES Products(productID) ON DELETE CASCADE,
     
-    INDEX idx_product_reviews (productID),
+    INDEX idx_product_reviews (productID, feedbackDate),
     INDEX idx_user_reviews (userID),
     INDEX idx_rating (rating),
     INDEX idx_review_date (feedbackDate)
@@ -164,3 +167,82 @@ CREATE TABLE UserActivity (
     INDEX idx_inventory_activity (inventoryID, activityDate)
 
 );
+
+-- Daily seller sales, maintained by place_order and update_order_status
+CREATE TABLE SellerDailySales (
+    sellerID INT NOT NULL,
+    salesDate DATE NOT NULL,
+    orderCount INT NOT NULL DEFAULT 0,
+    itemsSold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (sellerID, salesDate)
+);
+
+CREATE TABLE SellerProductDailySales (
+    sellerID INT NOT NULL,
+    productID INT NOT NULL,
+    salesDate DATE NOT NULL,
+    itemsSold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (sellerID, salesDate, productID),
+    INDEX idx_seller_product_sales (sellerID, productID)
+);
+
+-- Remaining uses of each discount, split over slot rows so concurrent redemptions lock different rows
+CREATE TABLE DiscountUseSlots (
+    discountID INT NOT NULL,
+    slot SMALLINT NOT NULL,
+    remaining INT NOT NULL CHECK (remaining >= 0),
+
+    PRIMARY KEY (discountID, slot),
+    FOREIGN KEY (discountID) REFERENCES Discounts(discountID) ON DELETE CASCADE
+);
+
+-- Admin dashboard counters, each split over several slot rows
+CREATE TABLE ShopCounters (
+    counterName VARCHAR(50) NOT NULL,
+    slot TINYINT NOT NULL,
+    counterValue BIGINT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (counterName, slot)
+);
+
+-- Progress of resumable maintenance jobs, e.g. the payment sync high-water mark
+CREATE TABLE JobState (
+    jobName VARCHAR(50) PRIMARY KEY,
+    lastID BIGINT NOT NULL DEFAULT 0,
+    updatedAt DATETIME NOT NULL
+);
+
+-- Recommendation model, rebuilt by recommendations.py
+CREATE TABLE ItemNeighbors (
+    inventoryID INT NOT NULL,
+    neighborID INT NOT NULL,
+    score FLOAT NOT NULL,
+
+    PRIMARY KEY (inventoryID, neighborID)
+);
+
+CREATE TABLE ItemPopularity (
+    inventoryID INT PRIMARY KEY,
+    score FLOAT NOT NULL,
+
+    INDEX idx_popularity_score (score)
+);
+
+-- Per-product rating aggregates, maintained by add_review
+CREATE TABLE ProductRatingStats (
+    productID INT PRIMARY KEY,
+    reviewCount INT NOT NULL DEFAULT 0,
+    ratingTotal INT NOT NULL DEFAULT 0,
+    rating1 INT NOT NULL DEFAULT 0,
+    rating2 INT NOT NULL DEFAULT 0,
+    rating3 INT NOT NULL DEFAULT 0,
+    rating4 INT NOT NULL DEFAULT 0,
+    rating5 INT NOT NULL DEFAULT 0,
+    lastReview DATETIME,
+
+    FOREIGN KEY (productID) REFERENCES Products(productID) ON DELETE CASCADE
+);
@@ -0,0 +1,22 @@
+// Back to top functionality
+window.onscroll = function() {
+    if (document.body.scrollTop > 20 || document.documentElement.scrollTop > 20) {
+        const btn = document.getElementById("backToTopBtn");
+        if (btn) btn.style.display = "block";
+    } else {
+        const btn = document.getElementById("backToTopBtn");
+        if (btn) btn.style.display = "none";
+    }
+};
+
+function topFunction() {
+    document.body.scrollTop = 0;
+    document.documentElement.scrollTop = 0;
+}
+setTimeout(function() {
+    let flashMessages = document.querySelectorAll('.alert.alert-dismissible');
+    flashMessages.forEach(function(alert) {
+        let bsAlert = new bootstrap.Alert(alert);
+        bsAlert.close();
+    });
+}, 5000);
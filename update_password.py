@@ -1,4 +1,11 @@
 from werkzeug.security import generate_password_hash
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import json
+import os
+import secrets
+import time
 import mysql.connector
 
 # Database configuration
@@ -9,27 +16,141 @@ DB_CONFIG = {
     'database': 'enter_your_database_name'
 }
 
-def simple_password_update():
-    """Update all user passwords to demo123 and print Done"""
-    
-    new_password = "demo123"
-    password_hash = generate_password_hash(new_password)
+BATCH_SIZE = 1000           # users read, hashed and written per transaction
+STATE_FILE = 'update_password.state.json'
+HASH_CHUNK = 32             # passwords sent to a worker process at a time
+
+def hash_password(args):
+    password, method = args
+    return generate_password_hash(password, method) if method else generate_password_hash(password)
+
+def hash_prefix(method):
+    """The 'scrypt:32768:8:1' part that identifies hashes made with method"""
+    return hash_password(('x', method)).split('$', 1)[0]
 
+def build_filter(args):
+    conditions, params = ["userID > %s"], []
+    if args.role:
+        conditions.append("role = %s")
+        params.append(args.role)
+    if args.status:
+        conditions.append("status = %s")
+        params.append(args.status)
+    if args.max_id:
+        conditions.append("userID <= %s")
+        params.append(args.max_id)
+    if args.outdated:
+        # Only users whose hash wasn't made with the target method
+        conditions.append("password NOT LIKE %s")
+        params.append(hash_prefix(args.method) + '$%')
+    return ' AND '.join(conditions), params
+
+def load_state(path):
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
 
-        # Update all passwords
-        cursor.execute("UPDATE Users SET password = %s", (password_hash,))
-        conn.commit()
+def save_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
 
-        print("Done")
+def update_passwords(args):
+    """Stream the selected users, hash on all cores and write back batch by batch"""
+    state = load_state(args.state_file) if args.resume else None
+    start_id = state['last_id'] if state else args.min_id
+    where, params = build_filter(args)
+
+    read_conn = mysql.connector.connect(**DB_CONFIG)
+    write_conn = mysql.connector.connect(**DB_CONFIG)
+    count_cursor = read_conn.cursor()
+    count_cursor.execute(f"SELECT COUNT(*) FROM Users WHERE {where}", [start_id] + params)
+    total = count_cursor.fetchone()[0]
+    count_cursor.close()
+    print(f"{total} users to update starting after userID {start_id}"
+          f"{' (dry run, nothing will be written)' if args.dry_run else ''}")
+
+    # Unbuffered cursor: rows stream from the server instead of being loaded all at once
+    read_cursor = read_conn.cursor(buffered=False)
+    read_cursor.execute(f"SELECT userID FROM Users WHERE {where} ORDER BY userID", [start_id] + params)
+    write_cursor = write_conn.cursor()
+    report = open(args.random, 'a', newline='') if args.random else None
+    writer = csv.writer(report) if report else None
+
+    done = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while True:
+                user_ids = [row[0] for row in read_cursor.fetchmany(args.batch_size)]
+                if not user_ids:
+                    break
+                if args.random:
+                    passwords = [secrets.token_urlsafe(12) for _ in user_ids]
+                else:
+                    passwords = [args.password] * len(user_ids)
+                hashes = list(pool.map(hash_password, [(password, args.method) for password in passwords],
+                                       chunksize=HASH_CHUNK))
 
+                if not args.dry_run:
+                    write_cursor.executemany("UPDATE Users SET password = %s WHERE userID = %s",
+                                             list(zip(hashes, user_ids)))
+                    write_conn.commit()
+                    if writer:
+                        writer.writerows(zip(user_ids, passwords))
+                        report.flush()
+                    save_state(args.state_file, {'last_id': user_ids[-1], 'updated': done + len(user_ids)})
+
+                done += len(user_ids)
+                elapsed = time.perf_counter() - started
+                rate = done / elapsed if elapsed else 0
+                remaining = (total - done) / rate if rate else 0
+                print(f"{done}/{total} users, {rate:,.0f}/s, last userID {user_ids[-1]}, "
+                      f"about {remaining:,.0f}s left", flush=True)
+    finally:
+        if report:
+            report.close()
+        read_cursor.close()
+        write_cursor.close()
+        read_conn.close()
+        write_conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{'Would update' if args.dry_run else 'Updated'} {done} users in {elapsed:.1f}s")
+    if not args.dry_run and os.path.exists(args.state_file):
+        os.remove(args.state_file)
+
+def simple_password_update(args=None):
+    """Update all user passwords to demo123 and print Done"""
+    if args is None:
+        args = parse_args([])
+    try:
+        update_passwords(args)
+        print("Done")
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        if conn:
-            conn.close()
+        if not args.dry_run:
+            print(f"Re-run with --resume to continue from {args.state_file}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rehash or reset Users.password, one salt per user")
+    parser.add_argument('--password', default='demo123', help="password to set (default: demo123)")
+    parser.add_argument('--random', metavar='CSV', help="give each user a random password and append userID,password to CSV")
+    parser.add_argument('--method', help="werkzeug hash method, e.g. scrypt:32768:8:1 (default: werkzeug's default)")
+    parser.add_argument('--outdated', action='store_true', help="only users whose hash doesn't use --method")
+    parser.add_argument('--role', choices=['customer', 'seller', 'admin'])
+    parser.add_argument('--status', choices=['active', 'banned'])
+    parser.add_argument('--min-id', type=int, default=0, help="only users with a userID above this")
+    parser.add_argument('--max-id', type=int, help="only users with a userID up to this")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="hashing processes (default: all cores)")
+    parser.add_argument('--state-file', default=STATE_FILE, help="progress file used by --resume")
+    parser.add_argument('--resume', action='store_true', help="continue after the last userID in the state file")
+    parser.add_argument('--dry-run', action='store_true', help="read and hash but don't write anything")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    simple_password_update()
+    simple_password_update(parse_args())